@@ -1,44 +1,63 @@
 """FastAPI service for MSSQL Failure Intelligence Agent."""
 import asyncio
-import hashlib
-import json
+import atexit
 import os
 import logging
-from datetime import datetime, timedelta
+import logging.handlers
+import queue
+from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
-from fastapi import FastAPI, HTTPException, Header, Request
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, HTTPException, Header, Request, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from config.settings import settings
-from connectors.mssql import MSSQLConnector
+from connectors.mssql import MSSQLConnectionPool
 from features.failure_analyzer import FailureAnalyzer
+from features.watermark import FailureWatermark
 from mail.formatter import EmailFormatter
 from mail.sender import EmailSender
+from mail.tracker import DuplicateTracker, THROTTLE_HOURS
 import dotenv
 
 # Configure logging
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
+# Records are queued on the request path; a listener thread does the file/console I/O
+_log_queue: queue.SimpleQueue = queue.SimpleQueue()
+_root_logger = logging.getLogger()
+# Keep handlers an entrypoint already configured (e.g. run_service.py); otherwise log to file and console
+_log_handlers = _root_logger.handlers[:]
+if not _log_handlers:
+    _log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    _log_handlers = [
         logging.FileHandler(LOG_DIR / "mssql_agent.log"),
         logging.StreamHandler()
     ]
-)
+    for _handler in _log_handlers:
+        _handler.setFormatter(_log_formatter)
+log_listener = logging.handlers.QueueListener(_log_queue, *_log_handlers, respect_handler_level=True)
+_queue_handler = logging.handlers.QueueHandler(_log_queue)
+_queue_handler.setFormatter(logging.Formatter('%(message)s'))  # Listener handlers add the full layout
+# Installed directly: basicConfig() is a no-op once the root logger has handlers
+_root_logger.handlers = [_queue_handler]
+_root_logger.setLevel(logging.INFO)
+log_listener.start()
+atexit.register(log_listener.stop)  # Flush queued records on interpreter exit
 logger = logging.getLogger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(
     title="MSSQL Failure Intelligence Agent",
     description="Automated SQL Server job failure analysis and notification system",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware for internal use
@@ -51,92 +70,140 @@ app.add_middleware(
 )
 
 # Duplicate tracking file path
-DATA_DIR = Path("/data") if os.path.exists("/data") else Path("data")
-DATA_DIR.mkdir(parents=True, exist_ok=True)
-SENT_LOG_FILE = DATA_DIR / "email_sent_log.json"
-logger.info(f"Data directory: {DATA_DIR}")
-logger.info(f"Sent log file: {SENT_LOG_FILE}")
+DATA_DIR = Path(os.getenv("DATA_DIR", "/data" if Path("/data").is_dir() else "data"))
+SENT_DB_FILE = DATA_DIR / "email_sent_log.db"
+LEGACY_SENT_LOG_FILE = DATA_DIR / "email_sent_log.jsonl"  # Imported once into SENT_DB_FILE
+
+# Failure source table and batch polling
+FAILURE_TABLE = "FailedJobData_Archive"
+FAILURE_TIME_COLUMN = "FailedDateTime"
+FAILURE_BATCH_SIZE = 50
+WATERMARK_FILE = DATA_DIR / "last_processed_failure.txt"
+watermark = FailureWatermark(WATERMARK_FILE, time_column=FAILURE_TIME_COLUMN)
+ANALYSIS_CACHE_FILE = DATA_DIR / "analysis_cache.json"
+logger.info("Data directory: %s", DATA_DIR)
+logger.info("Sent log database: %s", SENT_DB_FILE)
 
 # API Key for authentication
 API_KEY = os.getenv("API_KEY", "your-secret-api-key-change-this")
 
 
-class DuplicateTracker:
-    """Track sent emails to prevent duplicates."""
-    
-    def __init__(self, log_file: Path):
-        self.log_file = log_file
-        self.load_log()
-    
-    def load_log(self):
-        """Load sent email log from file."""
-        if self.log_file.exists():
-            try:
-                with open(self.log_file, 'r') as f:
-                    self.sent_log = json.load(f)
-                logger.info(f"Loaded {len(self.sent_log)} sent email records")
-            except Exception as e:
-                logger.error(f"Error loading log file: {e}")
-                self.sent_log = []
-        else:
-            logger.info(f"No existing log file found at {self.log_file}, starting fresh")
-            self.sent_log = []
-    
-    def save_log(self):
-        """Save sent email log to file."""
-        try:
-            with open(self.log_file, 'w') as f:
-                json.dump(self.sent_log, f, indent=2)
-            logger.info(f"Saved log with {len(self.sent_log)} records to {self.log_file}")
-        except Exception as e:
-            logger.error(f"Error saving log file: {e}")
-    
-    def create_hash(self, job_data: Dict[str, Any]) -> str:
-        """Create unique hash for job failure."""
-        key = f"{job_data.get('JobName')}_{job_data.get('ServerName')}_{job_data.get('FailedDateTime')}_{job_data.get('FailureMessage')}"
-        return hashlib.md5(key.encode()).hexdigest()
-    
-    def should_send(self, job_data: Dict[str, Any], throttle_hours: int = 24) -> tuple[bool, Optional[Dict]]:
-        """
-        Check if email should be sent (not sent within throttle window).
-        
-        Returns:
-            (should_send: bool, last_sent_info: Optional[Dict])
-        """
-        email_hash = self.create_hash(job_data)
-        
-        # Find if this failure was sent before
-        for entry in reversed(self.sent_log):  # Check most recent first
-            if entry['hash'] == email_hash:
-                sent_time = datetime.fromisoformat(entry['sent_at'])
-                time_diff = datetime.now() - sent_time
-                
-                if time_diff < timedelta(hours=throttle_hours):
-                    # Too soon, don't send
-                    return False, entry
-        
-        return True, None
-    
-    def log_sent(self, job_data: Dict[str, Any], recipient: str):
-        """Log that email was sent."""
-        entry = {
-            'hash': self.create_hash(job_data),
-            'job_name': job_data.get('JobName'),
-            'server_name': job_data.get('ServerName'),
-            'failed_at': job_data.get('FailedDateTime'),
-            'sent_to': recipient,
-            'sent_at': datetime.now().isoformat()
-        }
-        self.sent_log.append(entry)
-        self.save_log()
+# Duplicate tracker and shared MSSQL connection pool (opened on startup)
+tracker: Optional[DuplicateTracker] = None
+db_pool: Optional[MSSQLConnectionPool] = None
+
+
+@app.on_event("startup")
+def open_tracker():
+    """Create the data directory and open the sent-email tracker."""
+    global tracker
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    tracker = DuplicateTracker(SENT_DB_FILE, legacy_log_file=LEGACY_SENT_LOG_FILE)
+
+
+@app.on_event("startup")
+def open_db_pool():
+    """Pre-open the shared MSSQL connection pool."""
+    global db_pool
+    db_pool = MSSQLConnectionPool(
+        settings.get_db_config(),
+        size=settings.MSSQL_POOL_SIZE,
+        timeout=settings.MSSQL_POOL_TIMEOUT
+    )
+    opened = db_pool.open()
+    logger.info("MSSQL pool ready: %s/%s connections open", opened, settings.MSSQL_POOL_SIZE)
+
+
+@app.on_event("shutdown")
+def close_db_pool():
+    """Close pooled MSSQL connections and the SMTP connection."""
+    if db_pool:
+        db_pool.close()
+    get_sender().close()
+
+
+@app.on_event("shutdown")
+async def flush_analysis_cache():
+    """Let background analysis cache writes finish before exit."""
+    if get_analyzer.cache_info().currsize:
+        await get_analyzer().flush()
+
+
+@lru_cache(maxsize=1)
+def get_analyzer() -> FailureAnalyzer:
+    """Shared failure analyzer; the LLM client is built once per process."""
+    return FailureAnalyzer(cache_file=ANALYSIS_CACHE_FILE)
+
+
+@lru_cache(maxsize=1)
+def get_formatter() -> EmailFormatter:
+    """Shared email formatter; the template is loaded once per process."""
+    return EmailFormatter()
+
+
+@lru_cache(maxsize=1)
+def get_sender() -> EmailSender:
+    """Shared email sender; keeps its SMTP connection open between sends."""
+    return EmailSender(settings.get_email_config())
+
+
+def get_db_pool() -> MSSQLConnectionPool:
+    """Provide the shared MSSQL connection pool to endpoints."""
+    return db_pool
+
+
+def _check_database(pool: MSSQLConnectionPool) -> bool:
+    """Lease a pooled connection and run a probe query."""
+    try:
+        with pool.connection() as db:
+            healthy = db.test_connection()
+            if not healthy:
+                # Don't hand a connection that failed its probe to the next lease
+                db.disconnect()
+            return healthy
+    except Exception as e:
+        logger.error("Database health check failed: %s", e)
+        return False
+
+
+def _fetch_latest_failure(pool: MSSQLConnectionPool) -> Dict[str, Any]:
+    """Lease a pooled connection and fetch the most recent job failure."""
+    with pool.connection() as db:
+        return db.fetch_last_row(FAILURE_TABLE)
+
+
+def _fetch_new_failures(
+    pool: MSSQLConnectionPool,
+    since: Optional[Tuple[datetime, Any]]
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Lease a pooled connection and fetch failures past the watermark, oldest first.
     
-    def get_recent_sent(self, limit: int = 20) -> List[Dict]:
-        """Get recently sent emails."""
-        return self.sent_log[-limit:][::-1]  # Return last N in reverse order
+    Returns:
+        The rows, plus the table's primary-key column used to break ties
+    """
+    with pool.connection() as db:
+        key_column = db.primary_key(FAILURE_TABLE)
+        if since is None:
+            # First run: start from the latest failure rather than the whole archive
+            latest = db.fetch_last_row(FAILURE_TABLE, order_by=FAILURE_TIME_COLUMN)
+            return ([latest] if latest else []), key_column
+        failed_at, key = since
+        rows = db.fetch_rows_since(
+            FAILURE_TABLE, FAILURE_TIME_COLUMN, failed_at,
+            limit=FAILURE_BATCH_SIZE, since_key=key
+        )
+        return rows, key_column
+
 
+def _sendable_jobs(jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Return the jobs not emailed within the throttle window."""
+    return [job for job in jobs if tracker.should_send(job, throttle_hours=THROTTLE_HOURS)[0]]
 
-# Initialize tracker
-tracker = DuplicateTracker(SENT_LOG_FILE)
+
+def _sent_at_iso(entry: Dict[str, Any]) -> str:
+    """Render a log entry's epoch sent_at as ISO-8601 for API responses."""
+    return datetime.fromtimestamp(entry['sent_at']).isoformat()
 
 
 def verify_api_key(x_api_key: str = Header(None)):
@@ -156,6 +223,7 @@ async def root():
         "endpoints": {
             "health": "/api/v1/health",
             "analyze_latest": "/api/v1/analyze-latest",
+            "analyze_new": "/api/v1/analyze-new",
             "sent_history": "/api/v1/sent-history",
             "clear_history": "/api/v1/clear-history (DELETE)"
         }
@@ -163,12 +231,11 @@ async def root():
 
 
 @app.get("/api/v1/health")
-async def health_check():
+async def health_check(pool: MSSQLConnectionPool = Depends(get_db_pool)):
     """Health check endpoint."""
     try:
-        db = MSSQLConnector(settings.get_db_config())
-        db_healthy = db.test_connection()
-        db.disconnect()
+        # pyodbc is blocking; keep it off the event loop
+        db_healthy = await run_in_threadpool(_check_database, pool)
         
         return {
             "status": "healthy",
@@ -177,7 +244,7 @@ async def health_check():
             "gemini_api": "configured" if settings.GEMINI_API_KEY else "not_configured"
         }
     except Exception as e:
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=503,
             content={
                 "status": "unhealthy",
@@ -187,82 +254,163 @@ async def health_check():
         )
 
 
+async def _process_failure(
+    job_data: Dict[str, Any],
+    analyzer: FailureAnalyzer,
+    formatter: EmailFormatter,
+    sender: EmailSender
+) -> Dict[str, Any]:
+    """
+    Throttle-check, analyze and email a single job failure.
+    
+    Returns:
+        Result dict with status 'sent', 'throttled' or 'failed'
+    """
+    # Get recipient from DB or use default
+    recipient = job_data.get('EmailID') or job_data.get('EmailId') or settings.SENDER_EMAIL
+    logger.info("Job: %s, Recipient: %s", job_data.get('JobName'), recipient)
+    
+    # Check if we should send (duplicate check; sqlite3 is blocking, keep it off the event loop)
+    should_send, last_sent = await run_in_threadpool(
+        tracker.should_send, job_data, throttle_hours=THROTTLE_HOURS
+    )
+    
+    if not should_send:
+        logger.info("THROTTLED: Email already sent for %s", job_data.get('JobName'))
+        return {
+            "status": "throttled",
+            "message": f"Email already sent for this failure within last {THROTTLE_HOURS} hours",
+            "job_name": job_data.get('JobName'),
+            "last_sent_at": _sent_at_iso(last_sent), #type: ignore
+            "last_sent_to": last_sent['sent_to']  #type: ignore
+        }
+    
+    # Analyze with LLM while the SMTP handshake happens in the threadpool
+    logger.info("Analyzing with Gemini...")
+    analysis, _ = await asyncio.gather(
+        analyzer.analyze(job_data),
+        run_in_threadpool(sender.ensure_connected)
+    )
+    logger.info("Analysis complete: %s characters", len(analysis))
+    
+    # Format email
+    html_body, plain_body = formatter.format_email(analysis, job_data, settings.SENDER_EMAIL)
+    
+    # Send email (smtplib is blocking; keep it off the event loop)
+    subject = f"[URGENT] SQL Job Failure: {job_data.get('JobName', 'Unknown Job')}"
+    logger.info("Sending email to %s...", recipient)
+    success = await run_in_threadpool(
+        sender.send,
+        recipient=recipient,
+        subject=subject,
+        html_body=html_body,
+        plain_body=plain_body
+    )
+    
+    if not success:
+        logger.error("Failed to send email")
+        return {
+            "status": "failed",
+            "message": "Failed to send email",
+            "job_name": job_data.get('JobName')
+        }
+    
+    # Log the sent email
+    await run_in_threadpool(tracker.log_sent, job_data, recipient)
+    logger.info("✓ Email sent successfully to %s", recipient)
+    
+    return {
+        "status": "sent",
+        "message": "Email sent successfully",
+        "job_name": job_data.get('JobName'),
+        "server_name": job_data.get('ServerName'),
+        "failed_at": job_data.get('FailedDateTime'),
+        "sent_to": recipient,
+        "sent_at": datetime.now().isoformat()
+    }
+
+
 @app.post("/api/v1/analyze-latest")
-async def analyze_latest(x_api_key: str = Header(None)):
+async def analyze_latest(
+    x_api_key: str = Header(None),
+    pool: MSSQLConnectionPool = Depends(get_db_pool)
+):
     """Analyze latest job failure and send email."""
     verify_api_key(x_api_key)
     
     logger.info("=== Starting analyze_latest endpoint ===")
     
     try:
-        # Initialize components
-        db = MSSQLConnector(settings.get_db_config())
-        analyzer = FailureAnalyzer()
-        formatter = EmailFormatter()
-        sender = EmailSender(settings.get_email_config())
+        # Shared components
+        analyzer = get_analyzer()
+        formatter = get_formatter()
+        sender = get_sender()
         
-        # Fetch latest failure
-        with db:
-            job_data = db.fetch_last_row("FailedJobData_Archive")
-            if not job_data:
-                logger.warning("No job failures found in database")
-                return {"status": "no_failures", "message": "No job failures found in database"}
-            
-            # Get recipient from DB or use default
-            recipient = job_data.get('EmailID') or job_data.get('EmailId') or settings.SENDER_EMAIL
-            logger.info(f"Job: {job_data.get('JobName')}, Recipient: {recipient}")
+        # Fetch latest failure (pyodbc is blocking; keep it off the event loop)
+        job_data = await run_in_threadpool(_fetch_latest_failure, pool)
+        if not job_data:
+            logger.warning("No job failures found in database")
+            return {"status": "no_failures", "message": "No job failures found in database"}
         
-        # Check if we should send (duplicate check)
-        should_send, last_sent = tracker.should_send(job_data, throttle_hours=24)
+        result = await _process_failure(job_data, analyzer, formatter, sender)
+        if result["status"] == "failed":
+            raise HTTPException(status_code=500, detail=result["message"])
+        return result
+            
+    except Exception as e:
+        logger.error("Error in analyze_latest: %s", e, exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/v1/analyze-new")
+async def analyze_new(
+    x_api_key: str = Header(None),
+    pool: MSSQLConnectionPool = Depends(get_db_pool)
+):
+    """Analyze every job failure since the last processed one and send emails."""
+    verify_api_key(x_api_key)
+    
+    logger.info("=== Starting analyze_new endpoint ===")
+    
+    try:
+        # Shared components
+        analyzer = get_analyzer()
+        formatter = get_formatter()
+        sender = get_sender()
         
-        if not should_send:
-            logger.info(f"THROTTLED: Email already sent for {job_data.get('JobName')}")
-            return {
-                "status": "throttled",
-                "message": "Email already sent for this failure within last 24 hours",
-                "job_name": job_data.get('JobName'),
-                "last_sent_at": last_sent['sent_at'], #type: ignore
-                "last_sent_to": last_sent['sent_to']  #type: ignore
-            }
+        # One round-trip for every failure past the high-water mark
+        since = watermark.load()
+        jobs, key_column = await run_in_threadpool(_fetch_new_failures, pool, since)
+        if not jobs:
+            logger.info("No new job failures since %s", since)
+            return {"status": "no_failures", "message": "No new job failures found in database"}
         
-        # Analyze with LLM
-        logger.info("Analyzing with Gemini...")
-        analysis = await analyzer.analyze(job_data)
-        logger.info(f"Analysis complete: {len(analysis)} characters")
+        # Identical rows would race each other past the throttle check
+        hashes = [tracker.create_hash(job) for job in jobs]
+        jobs_by_hash = dict(zip(hashes, jobs))
+        unique_jobs = list(jobs_by_hash.values())
+        logger.info("Processing %s new job failures", len(unique_jobs))
         
-        # Format email
-        html_body, plain_body = formatter.format_email(analysis, job_data, settings.SENDER_EMAIL)
+        # Analyze every sendable failure in one LLM request; _process_failure then hits the cache
+        sendable = await run_in_threadpool(_sendable_jobs, unique_jobs)
+        if len(sendable) > 1:
+            await analyzer.analyze_batch(sendable)
         
-        # Send email
-        subject = f"[URGENT] SQL Job Failure: {job_data.get('JobName', 'Unknown Job')}"
-        logger.info(f"Sending email to {recipient}...")
-        success = sender.send(
-            recipient=recipient,
-            subject=subject,
-            html_body=html_body,
-            plain_body=plain_body
+        results = await asyncio.gather(
+            *[_process_failure(job, analyzer, formatter, sender) for job in unique_jobs]
         )
         
-        if success:
-            # Log the sent email
-            tracker.log_sent(job_data, recipient)
-            logger.info(f"✓ Email sent successfully to {recipient}")
-            
-            return {
-                "status": "sent",
-                "message": "Email sent successfully",
-                "job_name": job_data.get('JobName'),
-                "server_name": job_data.get('ServerName'),
-                "failed_at": job_data.get('FailedDateTime'),
-                "sent_to": recipient,
-                "sent_at": datetime.now().isoformat()
-            }
-        else:
-            logger.error("Failed to send email")
-            raise HTTPException(status_code=500, detail="Failed to send email")
-            
+        # Failed rows hold the watermark, and are retried, for a few polls before being skipped
+        status_by_hash = dict(zip(jobs_by_hash, (result["status"] for result in results)))
+        watermark.advance(jobs, hashes, status_by_hash, key_column)
+        return {
+            "status": "success",
+            "count": len(results),
+            "results": results
+        }
+    
     except Exception as e:
-        logger.error(f"Error in analyze_latest: {e}", exc_info=True)
+        logger.error("Error in analyze_new: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -271,7 +419,8 @@ async def get_sent_history(limit: int = 20, x_api_key: str = Header(None)):
     """Get history of sent emails."""
     verify_api_key(x_api_key)
     
-    history = tracker.get_recent_sent(limit)
+    recent = await run_in_threadpool(tracker.get_recent_sent, limit)
+    history = [{**entry, 'sent_at': _sent_at_iso(entry)} for entry in recent]
     return {
         "status": "success",
         "count": len(history),
@@ -285,10 +434,8 @@ async def clear_history(x_api_key: str = Header(None)):
     verify_api_key(x_api_key)
     
     logger.info("Clearing email sent history")
-    old_count = len(tracker.sent_log)
-    tracker.sent_log = []
-    tracker.save_log()
-    logger.info(f"Cleared {old_count} records from history")
+    old_count = await run_in_threadpool(tracker.clear)
+    logger.info("Cleared %s records from history", old_count)
     
     return {
         "status": "success",
@@ -20,6 +20,8 @@ class Settings:
     MSSQL_DRIVER = os.getenv('MSSQL_DRIVER', 'ODBC Driver 18 for SQL Server')
     MSSQL_TRUST_CERT = os.getenv('MSSQL_TRUST_CERT', 'yes')
     MSSQL_ENCRYPT = os.getenv('MSSQL_ENCRYPT', 'yes')
+    MSSQL_POOL_SIZE = int(os.getenv('MSSQL_POOL_SIZE', 20))
+    MSSQL_POOL_TIMEOUT = int(os.getenv('MSSQL_POOL_TIMEOUT', 30))
     
     # Email Configuration
     SMTP_SERVER = os.getenv('SMTP_SERVER', 'bridgeheads.bskyb.com').strip("'\"")
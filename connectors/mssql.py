@@ -1,6 +1,58 @@
 """MSSQL database connector."""
+import base64
+import datetime
+import logging
+import queue
+import re
+import time
+from contextlib import contextmanager, suppress
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple
+
 import pyodbc
-from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Let the ODBC driver manager reuse physical connections across connect() calls
+pyodbc.pooling = True
+
+# Table/column names are interpolated into SQL, so only plain identifiers
+# (optionally schema-qualified, up to SQL Server's 128 characters) are allowed
+_IDENTIFIER_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]{0,127}(\.[A-Za-z_][A-Za-z0-9_]{0,127})?$')
+
+# cursor.description type codes converted when building row dicts
+_ISO_TYPES = (datetime.datetime, datetime.date, datetime.time)
+_BINARY_TYPES = (bytes, bytearray)
+
+
+def _to_plain(value: Any) -> Any:
+    """Keep native values; NULL becomes an empty string."""
+    return '' if value is None else value
+
+
+def _to_iso(value: Any) -> Any:
+    """Date/time values become ISO-8601 strings."""
+    return '' if value is None else value.isoformat()
+
+
+def _to_base64(value: Any) -> Any:
+    """Binary values become base64 text."""
+    return '' if value is None else base64.b64encode(value).decode('ascii')
+
+
+# Column names plus one converter per column
+RowLayout = Tuple[Tuple[str, ...], Tuple[Callable[[Any], Any], ...]]
+
+
+def _bracket(part: str) -> str:
+    """Delimit a single name part the way QUOTENAME() does."""
+    return f"[{part.replace(']', ']]')}]"
+
+
+def _quote_identifier(name: str) -> str:
+    """Return a [bracketed] identifier for a safe SQL name, else raise ValueError."""
+    if not _IDENTIFIER_RE.match(name):
+        raise ValueError(f"Invalid SQL identifier: {name!r}")
+    return ".".join(_bracket(part) for part in name.split("."))
 
 
 class MSSQLConnector:
@@ -10,36 +62,79 @@ class MSSQLConnector:
         """Initialize connector with configuration."""
         self.config = config
         self.connection = None
+        self._cursor = None
+        self._pk_cache: Dict[str, Optional[str]] = {}
+        self._layout_cache: Dict[str, RowLayout] = {}
+        self._conn_str = self._build_connection_string(config)
+    
+    @staticmethod
+    def _build_connection_string(config: Dict[str, Any]) -> str:
+        """Build the ODBC connection string once per connector."""
+        connection_string = (
+            f"DRIVER={{{config['driver']}}};"
+            f"SERVER={config['server']};"
+            f"DATABASE={config['database']};"
+            f"UID={config['username']};"
+            f"PWD={config['password']};"
+        )
+        
+        # Add encryption parameters
+        if 'trust_certificate' in config:
+            connection_string += f"TrustServerCertificate={config['trust_certificate']};"
+        if 'encrypt' in config:
+            connection_string += f"Encrypt={config['encrypt']};"
+        return connection_string
     
     def connect(self) -> None:
         """Establish connection to MSSQL database."""
         try:
-            connection_string = (
-                f"DRIVER={{{self.config['driver']}}};"
-                f"SERVER={self.config['server']};"
-                f"DATABASE={self.config['database']};"
-                f"UID={self.config['username']};"
-                f"PWD={self.config['password']};"
-            )
-            
-            # Add encryption parameters
-            if 'trust_certificate' in self.config:
-                connection_string += f"TrustServerCertificate={self.config['trust_certificate']};"
-            if 'encrypt' in self.config:
-                connection_string += f"Encrypt={self.config['encrypt']};"
-            
-            self.connection = pyodbc.connect(connection_string, timeout=10)
-            print(f"✓ Connected to MSSQL: {self.config['server']}/{self.config['database']}")
+            # Read-only queries: autocommit skips the implicit transaction round-trip
+            self.connection = pyodbc.connect(self._conn_str, timeout=10, autocommit=True)
+            logger.debug("✓ Connected to MSSQL: %s/%s", self.config['server'], self.config['database'])
         except Exception as e:
-            print(f"✗ MSSQL connection error: {e}")
+            logger.error("✗ MSSQL connection error: %s", e)
             raise
     
     def disconnect(self) -> None:
         """Close MSSQL connection."""
         if self.connection:
-            self.connection.close()
-            self.connection = None
-            print("✓ MSSQL connection closed")
+            self._cursor = None
+            self._layout_cache.clear()
+            try:
+                self.connection.close()
+            finally:
+                self.connection = None
+            logger.debug("✓ MSSQL connection closed")
+    
+    def _execute(self, sql: str, *params: Any):
+        """
+        Execute SQL on the cursor reused for every query on this connection.
+        
+        A single cursor keeps at most one result set open, so a partly read
+        result from an earlier query never leaves the connection busy
+        (MARS is not enabled).
+        """
+        if self._cursor is None:
+            self._cursor = self.connection.cursor()
+        self._cursor.execute(sql, *params)
+        return self._cursor
+    
+    def primary_key(self, table_name: str) -> Optional[str]:
+        """Return the leading primary-key column of a table (looked up once per table)."""
+        if table_name not in self._pk_cache:
+            cursor = self._execute(
+                "SELECT kcu.COLUMN_NAME "
+                "FROM INFORMATION_SCHEMA.TABLE_CONSTRAINTS tc "
+                "JOIN INFORMATION_SCHEMA.KEY_COLUMN_USAGE kcu "
+                "ON kcu.CONSTRAINT_NAME = tc.CONSTRAINT_NAME AND kcu.TABLE_SCHEMA = tc.TABLE_SCHEMA "
+                "WHERE tc.CONSTRAINT_TYPE = 'PRIMARY KEY' AND tc.TABLE_NAME = PARSENAME(?, 1) "
+                "AND tc.TABLE_SCHEMA = COALESCE(PARSENAME(?, 2), SCHEMA_NAME()) "
+                "ORDER BY kcu.ORDINAL_POSITION",
+                table_name, table_name
+            )
+            row = cursor.fetchone()
+            self._pk_cache[table_name] = row[0] if row else None
+        return self._pk_cache[table_name]
     
     def fetch_last_row(self, table_name: str, order_by: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -47,7 +142,7 @@ class MSSQLConnector:
         
         Args:
             table_name: Name of the table
-            order_by: Column to order by (defaults to first column if None)
+            order_by: Column to order by (defaults to the table's primary key if None)
             
         Returns:
             Dictionary with column names as keys and row values
@@ -55,53 +150,134 @@ class MSSQLConnector:
         if not self.connection:
             raise Exception("Not connected to database")
         
+        table = _quote_identifier(table_name)
+        order = _quote_identifier(order_by) if order_by else None
+        
         try:
-            cursor = self.connection.cursor()
+            if not order:
+                primary_key = self.primary_key(table_name)
+                order = _bracket(primary_key) if primary_key else None
             
-            if not order_by:
-                cursor.execute(f"SELECT TOP 1 * FROM {table_name}")
+            if not order:
+                # No primary key to define "last"; any row will do
+                cursor = self._execute(f"SELECT TOP 1 * FROM {table}")
             else:
-                query = f"SELECT TOP 1 * FROM {table_name} ORDER BY {order_by} DESC"
-                cursor.execute(query)
+                cursor = self._execute(f"SELECT TOP 1 * FROM {table} ORDER BY {order} DESC")
             
             row = cursor.fetchone()
             
             if not row:
                 return {}
             
-            # Get column names and clean them (remove quotes)
-            columns = [column[0].strip('"') for column in cursor.description]
+            result = self._row_to_dict(self._layout(table_name, cursor.description), row)
             
-            # Convert row to dictionary
-            result = {}
-            for idx, column in enumerate(columns):
-                value = row[idx]
-                # Convert non-serializable types to strings
-                if hasattr(value, 'isoformat'):  # datetime objects
-                    result[column] = value.isoformat()
-                elif value is None:
-                    result[column] = ''
-                else:
-                    result[column] = str(value)
-            
-            print(f"✓ Fetched row from {table_name}: {list(result.keys())}")
+            logger.debug("✓ Fetched row from %s: %s", table_name, list(result))
             return result
             
         except Exception as e:
-            print(f"✗ Error fetching last row: {e}")
+            logger.error("✗ Error fetching last row: %s", e)
+            raise
+    
+    def fetch_rows_since(
+        self,
+        table_name: str,
+        since_column: str,
+        since_value: Any,
+        limit: int = 50,
+        since_key: Any = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetch rows newer than a high-water mark in a single round-trip.
+        
+        Rows are ordered by since_column and then the table's primary key,
+        so rows sharing the boundary value are never skipped when a batch
+        is cut off by limit.
+        
+        Args:
+            table_name: Name of the table
+            since_column: Column holding the high-water mark (e.g. FailedDateTime)
+            since_value: Only rows with since_column greater than this are returned
+            limit: Maximum number of rows to fetch
+            since_key: Primary key of the last row processed at since_value;
+                when given, later rows with the same since_value are included
+            
+        Returns:
+            List of row dictionaries, oldest first
+        """
+        if not self.connection:
+            raise Exception("Not connected to database")
+        
+        table = _quote_identifier(table_name)
+        column = _quote_identifier(since_column)
+        
+        try:
+            primary_key = self.primary_key(table_name)
+            if primary_key is None:
+                # Nothing to break ties on; rows are ordered by the mark alone
+                cursor = self._execute(
+                    f"SELECT TOP (?) * FROM {table} WHERE {column} > ? ORDER BY {column} ASC",
+                    limit, since_value
+                )
+            elif since_key is None:
+                key = _bracket(primary_key)
+                cursor = self._execute(
+                    f"SELECT TOP (?) * FROM {table} WHERE {column} > ? "
+                    f"ORDER BY {column} ASC, {key} ASC",
+                    limit, since_value
+                )
+            else:
+                key = _bracket(primary_key)
+                cursor = self._execute(
+                    f"SELECT TOP (?) * FROM {table} "
+                    f"WHERE {column} > ? OR ({column} = ? AND {key} > ?) "
+                    f"ORDER BY {column} ASC, {key} ASC",
+                    limit, since_value, since_value, since_key
+                )
+            
+            layout = self._layout(table_name, cursor.description)
+            rows = [self._row_to_dict(layout, row) for row in cursor.fetchall()]
+            
+            logger.debug("✓ Fetched %s rows from %s since %s", len(rows), table_name, since_value)
+            return rows
+            
+        except Exception as e:
+            logger.error("✗ Error fetching rows: %s", e)
             raise
     
+    def _layout(self, table_name: str, description: Any) -> RowLayout:
+        """Return column names and per-column converters for a table's SELECT * rows."""
+        layout = self._layout_cache.get(table_name)
+        # Rebuild if the column count changed (e.g. the table was altered)
+        if layout is None or len(layout[0]) != len(description):
+            columns = tuple(column[0] for column in description)
+            converters = tuple(
+                _to_iso if column[1] in _ISO_TYPES
+                else _to_base64 if column[1] in _BINARY_TYPES
+                else _to_plain
+                for column in description
+            )
+            layout = self._layout_cache[table_name] = (columns, converters)
+        return layout
+    
+    @staticmethod
+    def _row_to_dict(layout: RowLayout, row: Any) -> Dict[str, Any]:
+        """Convert a pyodbc row to a dictionary, keeping native value types."""
+        columns, converters = layout
+        return {
+            column: convert(value)
+            for column, convert, value in zip(columns, converters, row)
+        }
+    
     def test_connection(self) -> bool:
         """Test if MSSQL connection is working."""
         try:
             if not self.connection:
                 self.connect()
-            cursor = self.connection.cursor()
-            cursor.execute("SELECT 1")
-            cursor.fetchone()
+            # fetchval returns the scalar without building a Row
+            self._execute("SELECT 1").fetchval()
             return True
         except Exception as e:
-            print(f"✗ Connection test failed: {e}")
+            logger.warning("✗ Connection test failed: %s", e)
             return False
     
     def __enter__(self):
@@ -113,3 +289,109 @@ class MSSQLConnector:
         """Context manager exit."""
         self.disconnect()
         return False
+
+
+class MSSQLConnectionPool:
+    """Fixed-size pool of connected MSSQLConnector instances."""
+    
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        size: int = 20,
+        timeout: float = 30,
+        ping_interval: float = 30
+    ):
+        """
+        Initialize pool with configuration.
+        
+        Args:
+            config: Database configuration passed to each connector
+            size: Maximum number of pooled connections
+            timeout: Seconds to wait for a free connection before giving up
+            ping_interval: Connections released more recently than this are not pre-pinged
+        """
+        self.timeout = timeout
+        self.ping_interval = ping_interval
+        self._idle: queue.Queue = queue.Queue(maxsize=size)
+        # Connector -> monotonic time it was last returned to the pool
+        self._released_at: Dict[int, float] = {}
+        for _ in range(size):
+            self._idle.put(MSSQLConnector(config))
+    
+    def open(self) -> int:
+        """
+        Pre-open pooled connections.
+        
+        Stops at the first failure; remaining connections are opened lazily
+        on acquire.
+        
+        Returns:
+            Number of connections opened
+        """
+        connectors = []
+        while True:
+            try:
+                connectors.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+        
+        opened = 0
+        try:
+            for db in connectors:
+                if db.connection is None:
+                    db.connect()
+                    self._released_at[id(db)] = time.monotonic()
+                opened += 1
+        except Exception as e:
+            logger.warning("✗ Pool warm-up stopped after %s connections: %s", opened, e)
+        finally:
+            for db in connectors:
+                self._idle.put(db)
+        return opened
+    
+    def acquire(self) -> "MSSQLConnector":
+        """Lease a connector, replacing its connection if it went stale."""
+        try:
+            db = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No MSSQL connection available within {self.timeout}s")
+        
+        try:
+            # Pre-ping idle connections: discard dead ones and rebuild lazily
+            idle_for = time.monotonic() - self._released_at.get(id(db), 0.0)
+            if db.connection is not None and idle_for >= self.ping_interval and not db.test_connection():
+                db.disconnect()
+            if db.connection is None:
+                db.connect()
+        except Exception:
+            self._idle.put(db)
+            raise
+        return db
+    
+    def release(self, db: "MSSQLConnector") -> None:
+        """Return a leased connector to the pool."""
+        self._released_at[id(db)] = time.monotonic()
+        self._idle.put(db)
+    
+    @contextmanager
+    def connection(self) -> Iterator["MSSQLConnector"]:
+        """Context manager that leases a connector for the duration of the block."""
+        db = self.acquire()
+        try:
+            yield db
+        except Exception:
+            # The connection may be what failed; drop it so the next lease reconnects
+            with suppress(Exception):
+                db.disconnect()
+            raise
+        finally:
+            self.release(db)
+    
+    def close(self) -> None:
+        """Close all idle pooled connections."""
+        while True:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            db.disconnect()
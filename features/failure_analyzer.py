@@ -1,28 +1,175 @@
 """Job failure analyzer - main feature module."""
+import asyncio
+import hashlib
+import json
+import logging
 import os
+import string
+import tempfile
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, Any
-import sys
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from llm.gemini import GeminiProvider
+from typing import Dict, Any, AsyncIterator, List, Optional, Set, Tuple
+
+from llm import GeminiProvider
+
+logger = logging.getLogger(__name__)
+
+# Job fields the prompt template may reference
+PROMPT_FIELDS = ('JobName', 'ServerName', 'FailedDateTime', 'FailureMessage')
+
+# Fields identifying a failure for caching; FailedDateTime is left out so repeats share an analysis
+SIGNATURE_FIELDS = ('JobName', 'ServerName', 'FailureMessage')
+
+# Seconds an analysis is reused; a day, so it outlives restarts and the email throttle window
+CACHE_TTL = 24 * 3600
+
+# Failures per batched LLM request; each asks for a full structured analysis (~2k tokens)
+BATCH_SIZE = 4
+
+# Wraps several rendered prompts into one request; {count} is the number of failures
+BATCH_PROMPT_HEADER = """You will analyze {count} independent SQL Server job failures.
+Each failure below has its own instructions; follow them separately for each one.
+
+Respond with ONLY a JSON array, one object per failure, in this form:
+[{{"id": 1, "analysis": "<complete analysis text for failure 1>"}}, ...]
+
+"""
 
 
 class FailureAnalyzer:
     """Analyzes MSSQL job failures using LLM."""
     
-    def __init__(self):
-        """Initialize failure analyzer."""
+    PROMPT_FILE = Path(__file__).parent.parent / "prompts" / "llm_analysis.txt"
+    # Prompt template text by file path, shared by every analyzer in the process
+    _TEMPLATE_CACHE: Dict[str, str] = {}
+    
+    def __init__(
+        self,
+        cache_file: Optional[Path] = None,
+        cache_size: int = 256,
+        cache_ttl: float = CACHE_TTL,
+        batch_size: int = BATCH_SIZE
+    ):
+        """
+        Initialize failure analyzer.
+        
+        Args:
+            cache_file: Optional JSON file persisting analyses across restarts
+            cache_size: Maximum number of cached analyses
+            cache_ttl: Seconds a cached analysis stays valid
+            batch_size: Maximum failures analyzed per batched LLM request
+        """
         self.llm_provider = GeminiProvider()
         self._load_prompt_template()
+        self.cache_file = cache_file
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self.batch_size = batch_size
+        # signature -> (stored_at, analysis), least recently used first
+        self._cache: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        # signature -> generation in progress, shared by concurrent callers
+        self._inflight: Dict[str, asyncio.Task] = {}
+        # Serializes cache file writes so snapshots land in the order they were taken
+        self._save_lock = asyncio.Lock()
+        # Background cache writes still running, and whether one has yet to take its snapshot
+        self._save_tasks: Set[asyncio.Task] = set()
+        self._save_queued = False
+        self._load_cache()
+    
+    def _load_cache(self):
+        """Load persisted analyses, if a cache file is configured."""
+        if self.cache_file and self.cache_file.exists():
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    entries = json.load(f)
+                # Skip entries from the older untimestamped format
+                self._cache = OrderedDict(
+                    (key, tuple(entry)) for key, entry in entries.items() if isinstance(entry, list)
+                )
+            except Exception as e:
+                logger.warning("✗ Could not load analysis cache: %s", e)
+                self._cache = OrderedDict()
+    
+    def _schedule_save(self):
+        """Persist the cache in the background, if a cache file is configured."""
+        if not self.cache_file or self._save_queued:
+            # The queued write hasn't taken its snapshot yet, so it will include this change
+            return
+        self._save_queued = True
+        task = asyncio.ensure_future(self._save_cache())
+        self._save_tasks.add(task)
+        task.add_done_callback(self._save_tasks.discard)
+    
+    async def _save_cache(self):
+        """Write a snapshot of the cache on a worker thread."""
+        async with self._save_lock:
+            # Changes from here on need a newer snapshot, so let them queue another write
+            self._save_queued = False
+            snapshot = dict(self._cache)
+            try:
+                await asyncio.to_thread(self._write_cache, self.cache_file, snapshot)
+            except Exception as e:
+                logger.warning("✗ Could not save analysis cache: %s", e)
+    
+    async def flush(self):
+        """Wait for background cache writes to finish."""
+        while self._save_tasks:
+            await asyncio.gather(*self._save_tasks)
+    
+    @staticmethod
+    def _write_cache(cache_file: Path, entries: Dict[str, Tuple[float, str]]):
+        """Write the cache to a temp file and rename it over the old one."""
+        fd, tmp_path = tempfile.mkstemp(dir=cache_file.parent, prefix=cache_file.name, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, cache_file)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    
+    @staticmethod
+    def signature(job_data: Dict[str, Any]) -> str:
+        """Cache key for a failure: hash of job, server and message."""
+        raw = "|".join(str(job_data.get(name, '')) for name in SIGNATURE_FIELDS)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Return a cached analysis that is still within the TTL."""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        stored_at, analysis = entry
+        if time.time() - stored_at >= self.cache_ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return analysis
+    
+    def _cache_put(self, key: str, analysis: str):
+        """Store an analysis, evicting least recently used entries (call _schedule_save to persist)."""
+        self._cache[key] = (time.time(), analysis)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
     
     def _load_prompt_template(self):
-        """Load LLM prompt template."""
-        prompt_file = Path(__file__).parent.parent / "prompts" / "llm_analysis.txt"
+        """Load LLM prompt template (read from disk once per process)."""
+        key = str(self.PROMPT_FILE)
+        if key not in self._TEMPLATE_CACHE:
+            self._TEMPLATE_CACHE[key] = self._read_prompt_template(self.PROMPT_FILE)
+        self.prompt_template = self._TEMPLATE_CACHE[key]
+        self._compile_prompt_template()
+    
+    @staticmethod
+    def _read_prompt_template(prompt_file: Path) -> str:
+        """Read the prompt template file, falling back to a built-in prompt."""
         try:
             with open(prompt_file, 'r') as f:
-                self.prompt_template = f.read()
+                return f.read()
         except FileNotFoundError:
-            self.prompt_template = """
+            return """
 Analyze this SQL Server job failure:
 Job: {JobName}
 Server: {ServerName}
@@ -32,26 +179,152 @@ Error: {FailureMessage}
 Provide analysis with solution steps.
 """
     
+    def _compile_prompt_template(self):
+        """Parse the template's literal text and {field} references once."""
+        self._prompt_parts = [
+            (literal, field, spec)
+            for literal, field, spec, _ in string.Formatter().parse(self.prompt_template)
+        ]
+    
+    def format_prompt(self, job_data: Dict[str, Any]) -> str:
+        """Render the compiled prompt template with job failure data."""
+        values = {name: job_data.get(name, 'N/A') for name in PROMPT_FIELDS}
+        return "".join(
+            literal + (format(values[field], spec) if field is not None else '')
+            for literal, field, spec in self._prompt_parts
+        )
+    
     async def analyze(self, job_data: Dict[str, Any]) -> str:
         """
         Analyze job failure data using LLM.
         
+        Repeats of the same failure within the cache TTL reuse the stored
+        analysis, and concurrent identical calls share one LLM request.
+        
         Args:
             job_data: Dictionary with job failure information
             
         Returns:
             LLM analysis text with structured solution
         """
+        key = self.signature(job_data)
+        cached = self._cache_get(key)
+        if cached is not None:
+            logger.info("✓ Using cached analysis")
+            return cached
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(job_data, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled caller doesn't cancel the shared generation
+        return await asyncio.shield(task)
+    
+    async def _generate(self, job_data: Dict[str, Any], key: str) -> str:
+        """Run the LLM for a failure and cache a non-empty result."""
         # Format prompt with job data
-        prompt = self.llm_provider.format_prompt(job_data, self.prompt_template)
+        prompt = self.format_prompt(job_data)
         
         # Generate analysis
-        print("🤖 Analyzing job failure with LLM...")
+        logger.debug("🤖 Analyzing job failure with LLM...")
         analysis = await self.llm_provider.generate(prompt)
-        print(f"✓ Analysis completed ({len(analysis)} characters)")
+        logger.info("✓ Analysis completed (%s characters)", len(analysis))
+        
+        if analysis:
+            self._cache_put(key, analysis)
+            self._schedule_save()
         
         return analysis
     
+    async def analyze_stream(self, job_data: Dict[str, Any]) -> AsyncIterator[str]:
+        """
+        Analyze job failure data, yielding the analysis as the LLM produces it.
+        
+        A cached analysis is yielded in one piece; a streamed one is cached
+        once complete.
+        
+        Args:
+            job_data: Dictionary with job failure information
+            
+        Yields:
+            Successive pieces of the analysis text
+        """
+        key = self.signature(job_data)
+        cached = self._cache_get(key)
+        if cached is not None:
+            logger.info("✓ Using cached analysis")
+            yield cached
+            return
+        
+        logger.debug("🤖 Streaming job failure analysis from LLM...")
+        chunks = []
+        async for chunk in self.llm_provider.generate_stream(self.format_prompt(job_data)):
+            chunks.append(chunk)
+            yield chunk
+        
+        analysis = "".join(chunks)
+        logger.info("✓ Analysis completed (%s characters)", len(analysis))
+        if analysis:
+            self._cache_put(key, analysis)
+            self._schedule_save()
+    
+    async def analyze_batch(self, jobs: List[Dict[str, Any]]) -> List[str]:
+        """
+        Analyze several job failures with as few LLM requests as fit.
+        
+        Cached failures are skipped; the rest are sent batch_size at a time,
+        each request asking for a JSON array of analyses. Any failure a
+        batch response does not cover falls back to analyze().
+        
+        Args:
+            jobs: Job failure dictionaries
+            
+        Returns:
+            Analysis text for each job, in the same order
+        """
+        keys = [self.signature(job) for job in jobs]
+        pending = [(key, job) for key, job in dict(zip(keys, jobs)).items() if self._cache_get(key) is None]
+        
+        # Each failure asks for a full analysis, so large batches would hit the output limit
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        batches = [batch for batch in batches if len(batch) > 1]
+        if batches:
+            await asyncio.gather(*[self._analyze_batch_request(batch) for batch in batches])
+            self._schedule_save()
+        
+        # Cache hits return immediately; anything the batches missed runs on its own
+        return list(await asyncio.gather(*[self.analyze(job) for job in jobs]))
+    
+    async def _analyze_batch_request(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        """Analyze (signature, job) pairs in one LLM request and cache the analyses returned."""
+        prompt = BATCH_PROMPT_HEADER.format(count=len(batch)) + "".join(
+            f"--- FAILURE {i} ---\n{self.format_prompt(job)}\n"
+            for i, (_, job) in enumerate(batch, start=1)
+        )
+        
+        logger.info("🤖 Analyzing %s job failures in one LLM request...", len(batch))
+        try:
+            response = await self.llm_provider.generate(prompt)
+            for item in self._parse_batch_response(response):
+                index = int(item['id']) - 1
+                if 0 <= index < len(batch) and item.get('analysis'):
+                    self._cache_put(batch[index][0], str(item['analysis']))
+        except Exception as e:
+            logger.warning("✗ Batch analysis failed, analyzing individually: %s", e)
+    
+    @staticmethod
+    def _parse_batch_response(response: str) -> List[Dict[str, Any]]:
+        """Parse the JSON array from a batch response, tolerating a ```json fence."""
+        text = response.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[1] if "\n" in text else ""
+            text = text.rsplit("```", 1)[0]
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("batch response is not a JSON array")
+        return [item for item in items if isinstance(item, dict) and 'id' in item]
+    
     def is_available(self) -> bool:
         """Check if analyzer is ready to use."""
         return self.llm_provider.is_available()
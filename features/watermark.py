@@ -0,0 +1,106 @@
+"""Failure watermark - resume point for polling the failure archive."""
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, Sequence, Tuple
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+MAX_SEND_ATTEMPTS = 3  # Polls a failing row may hold the watermark before it is skipped
+
+
+class FailureWatermark:
+    """FailedDateTime and primary key of the last processed failure, plus retry counts."""
+    
+    def __init__(
+        self,
+        path: Path,
+        time_column: str = 'FailedDateTime',
+        max_attempts: int = MAX_SEND_ATTEMPTS
+    ):
+        """
+        Initialize the watermark.
+        
+        Args:
+            path: JSON file holding the watermark
+            time_column: Row field the watermark follows
+            max_attempts: Failed sends after which a row no longer holds the watermark
+        """
+        self.path = path
+        self.time_column = time_column
+        self.max_attempts = max_attempts
+    
+    def _read(self) -> Dict[str, Any]:
+        """Read the stored state; a missing or unreadable file is an empty one."""
+        try:
+            text = self.path.read_text().strip()
+        except FileNotFoundError:
+            return {}
+        if not text.startswith('{'):
+            # Older watermark files hold only the timestamp
+            return {"failed_at": text, "key": None}
+        try:
+            state = orjson.loads(text)
+        except ValueError:
+            return {}
+        return state if isinstance(state, dict) else {}
+    
+    def load(self) -> Optional[Tuple[datetime, Any]]:
+        """Return the FailedDateTime and primary key of the last processed failure, if any."""
+        state = self._read()
+        try:
+            return datetime.fromisoformat(state['failed_at']), state.get('key')
+        except (ValueError, KeyError, TypeError):
+            return None
+    
+    def advance(
+        self,
+        jobs: Sequence[Dict[str, Any]],
+        hashes: Sequence[str],
+        status_by_hash: Dict[str, str],
+        key_column: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Move the watermark past the leading run of handled rows.
+        
+        A row whose send failed holds the watermark so it is re-fetched on the
+        next poll. Once it has failed max_attempts times it is skipped, so one
+        bad row can't keep the rows after it from ever being fetched.
+        
+        Args:
+            jobs: Rows of this poll, oldest first
+            hashes: Failure hash of each row
+            status_by_hash: Result status ('sent', 'throttled', 'failed') per hash
+            key_column: Primary-key column stored alongside the time
+        
+        Returns:
+            The row the watermark now points at, or None if it did not move
+        """
+        state = self._read()
+        attempts: Dict[str, int] = state.get('attempts') or {}
+        for job_hash in set(hashes):
+            if status_by_hash[job_hash] == "failed":
+                attempts[job_hash] = attempts.get(job_hash, 0) + 1
+        
+        last_done = None
+        for job_hash, job in zip(hashes, jobs):
+            if status_by_hash[job_hash] == "failed":
+                if attempts[job_hash] < self.max_attempts:
+                    break
+                logger.error(
+                    "✗ Giving up on %s after %s failed sends", job.get('JobName'), attempts[job_hash]
+                )
+            # Rows behind the watermark are never fetched again
+            attempts.pop(job_hash, None)
+            last_done = job
+        
+        if last_done is not None and last_done.get(self.time_column):
+            state['failed_at'] = str(last_done[self.time_column])
+            state['key'] = last_done.get(key_column) if key_column else None
+        else:
+            last_done = None
+        state['attempts'] = attempts
+        self.path.write_bytes(orjson.dumps(state, default=str))
+        return last_done
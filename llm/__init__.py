@@ -1 +1,4 @@
 """LLM providers package."""
+from .gemini import GeminiProvider
+
+__all__ = ['GeminiProvider']
@@ -1,19 +1,36 @@
 """Gemini LLM provider."""
+import logging
 import os
+import google.ai.generativelanguage as glm
 import google.generativeai as genai
-from typing import Dict, Any
+from typing import AsyncIterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Finish reasons meaning the output was cut off by a content filter
+_BLOCKED_FINISH_REASONS = (glm.Candidate.FinishReason.SAFETY, glm.Candidate.FinishReason.RECITATION)
 
 
 class GeminiProvider:
     """Google Gemini AI provider."""
     
-    def __init__(self, api_key: str = None, model: str = None):
+    __slots__ = ('api_key', 'model', 'client')
+    
+    def __init__(
+        self,
+        api_key: str = None,
+        model: str = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ):
         """
         Initialize Gemini provider.
         
         Args:
             api_key: Gemini API key (defaults to GEMINI_API_KEY env var)
             model: Model name (defaults to GEMINI_MODEL env var or gemini-flash-latest)
+            temperature: Sampling temperature (model default if None)
+            max_tokens: Maximum output tokens (model default if None)
         """
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         self.model = model or os.getenv('GEMINI_MODEL', 'gemini-flash-latest')
@@ -21,18 +38,14 @@ class GeminiProvider:
         if not self.api_key:
             raise ValueError("Gemini API key is required")
         
-        # Configure Gemini
+        # Configure Gemini; the model handle is built once and reused for every call
         genai.configure(api_key=self.api_key)
-        self.client = genai.GenerativeModel(self.model)
-    
-    def format_prompt(self, job_data: Dict[str, Any], template: str) -> str:
-        """Format prompt template with job failure data."""
-        return template.format(
-            JobName=job_data.get('JobName', 'N/A'),
-            ServerName=job_data.get('ServerName', 'N/A'),
-            FailedDateTime=job_data.get('FailedDateTime', 'N/A'),
-            FailureMessage=job_data.get('FailureMessage', 'N/A')
-        )
+        generation_config = {}
+        if temperature is not None:
+            generation_config['temperature'] = temperature
+        if max_tokens is not None:
+            generation_config['max_output_tokens'] = max_tokens
+        self.client = genai.GenerativeModel(self.model, generation_config=generation_config or None)
     
     async def generate(self, prompt: str) -> str:
         """
@@ -45,10 +58,39 @@ class GeminiProvider:
             Generated text response
         """
         try:
-            response = self.client.generate_content(prompt)
+            # Keep the event loop free during the round-trip
+            response = await self.client.generate_content_async(prompt)
             return response.text
         except Exception as e:
-            print(f"✗ Gemini generation error: {e}")
+            logger.error("✗ Gemini generation error: %s", e)
+            raise
+    
+    async def generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Generate text using Gemini, yielding chunks as they arrive.
+        
+        Args:
+            prompt: Input prompt text
+            
+        Yields:
+            Successive pieces of the generated text
+        """
+        try:
+            response = await self.client.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                if not chunk.candidates:
+                    # The prompt was blocked; a partial stream must not pass for a full analysis
+                    raise ValueError(f"Gemini returned no candidates: {chunk.prompt_feedback}")
+                if chunk.candidates[0].finish_reason in _BLOCKED_FINISH_REASONS:
+                    raise ValueError(f"Gemini stopped the response: {chunk.candidates[0].finish_reason.name}")
+                if not chunk.parts:
+                    # A chunk carrying only a finish reason has no text
+                    continue
+                text = chunk.text
+                if text:
+                    yield text
+        except Exception as e:
+            logger.error("✗ Gemini streaming error: %s", e)
             raise
     
     def is_available(self) -> bool:
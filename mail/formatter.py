@@ -1,19 +1,77 @@
 """Email formatter - generates HTML from analysis."""
 import re
+import string
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+# Patterns used to pull structured fields out of the LLM analysis
+_JOB_RE = re.compile(r'Job Name:\s*(.+)')
+_INSTANCE_RE = re.compile(r'Instance:\s*(.+)')
+_FAILURE_RE = re.compile(r'Failure Time:\s*(.+)')
+_ERROR_CODE_RE = re.compile(r'Error Code:\s*(.+)')
+_SUMMARY_RE = re.compile(r'SUMMARY\n(.+?)(?:\n\n|\nURGENCY|$)', re.DOTALL)
+_URGENCY_LEVEL_RE = re.compile(r'URGENCY:\s*(HIGH|MEDIUM|LOW)', re.IGNORECASE)
+_URGENCY_MSG_RE = re.compile(r'URGENCY:.*?\n(.+?)(?:\n\n|\nSOLUTION|$)', re.DOTALL)
+_SOLUTION_RE = re.compile(r'SOLUTION STEPS\n\n(.*?)(?:\nPREVENTIVE MEASURES|$)', re.DOTALL)
+_STEP_RE = re.compile(r'^Step \d+:')
+# Bare SQL lines in analyses that don't use ```sql fences
+_SQL_KW_RE = re.compile(r'\b(?:SELECT|INSERT|UPDATE|DELETE|MERGE|CREATE|WITH|USE|EXEC)\b', re.IGNORECASE)
+
+
+# Wrappers for solution steps and SQL blocks
+_STEP_OPEN = '<div class="step-item">'
+_CODE_OPEN = '<div class="sql-query">'
+_DIV_CLOSE = '</div>'
+
+# Urgency level -> (background color, border color, level)
+_URGENCY_STYLES = {
+    'HIGH': ('#ffebee', '#f44336', 'HIGH'),
+    'MEDIUM': ('#fff3e0', '#ff9800', 'MEDIUM'),
+    'LOW': ('#e8f5e9', '#4caf50', 'LOW')
+}
+
+# Single-pass HTML escaping of &, <, >, " and '
+_ESCAPE_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#39;'
+})
+
+
+class _PlaceholderTemplate(string.Template):
+    """string.Template over the {{name}} placeholders of the HTML email template."""
+    
+    # Only {{name}} is a placeholder; $ is plain text and unknown names are left as written
+    pattern = r"""
+        \{\{(?:
+            (?P<named>\w+)\}\}
+            | (?P<braced>(?!))
+            | (?P<escaped>(?!))
+            | (?P<invalid>(?!))
+        )
+    """
 
 
 class EmailFormatter:
     """Service for formatting email content with HTML templates."""
     
+    TEMPLATE_PATH = Path(__file__).parent.parent / "prompts" / "email_template.html"
+    _TEMPLATE: Optional[_PlaceholderTemplate] = None
+    
     def __init__(self):
         """Initialize email formatter and load template."""
-        # Load email template
-        template_path = Path(__file__).parent.parent / "prompts" / "email_template.html"
-        with open(template_path, 'r', encoding='utf-8') as f:
-            self.email_template = f.read()
+        self._template = self._get_template()
+    
+    @classmethod
+    def _get_template(cls) -> _PlaceholderTemplate:
+        """Read and parse the email template once per process."""
+        if cls._TEMPLATE is None:
+            with open(cls.TEMPLATE_PATH, 'r', encoding='utf-8') as f:
+                cls._TEMPLATE = _PlaceholderTemplate(f.read())
+        return cls._TEMPLATE
     
     def format_with_analysis(
         self,
@@ -38,28 +96,22 @@ class EmailFormatter:
         solution_html = self._format_solution(analysis)
         urgency_info = self._extract_urgency(analysis)
         
-        # Replace template placeholders
-        html = self.email_template
-        replacements = {
-            '{{job_name}}': error_details['job_name'],
-            '{{instance_name}}': error_details['instance'],
-            '{{failure_time}}': error_details['failure_time'],
-            '{{error_code}}': error_details['error_code'],
-            '{{error_summary}}': quick_summary,
-            '{{solution_content}}': solution_html,
-            '{{urgency_level}}': urgency_info['level'],
-            '{{urgency_color}}': urgency_info['color'],
-            '{{urgency_border}}': urgency_info['border'],
-            '{{urgency_message}}': urgency_info['message'],
-            '{{contact_email}}': 'dba-team@sky.uk',
-            '{{timestamp}}': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            '{{sender_email}}': sender_email
-        }
-        
-        for placeholder, value in replacements.items():
-            html = html.replace(placeholder, str(value))
-        
-        return html
+        # Fill every template placeholder in a single pass
+        return self._template.safe_substitute(
+            job_name=error_details['job_name'],
+            instance_name=error_details['instance'],
+            failure_time=error_details['failure_time'],
+            error_code=error_details['error_code'],
+            error_summary=quick_summary,
+            solution_content=solution_html,
+            urgency_level=urgency_info['level'],
+            urgency_color=urgency_info['color'],
+            urgency_border=urgency_info['border'],
+            urgency_message=urgency_info['message'],
+            contact_email='dba-team@sky.uk',
+            timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            sender_email=sender_email
+        )
     
     def format_email(self, analysis: str, job_data: Dict[str, Any], sender_email: str = None) -> tuple:
         """
@@ -88,137 +140,126 @@ class EmailFormatter:
         Returns:
             Plain text string
         """
-        body = "MSSQL Job Failure Alert\n\n"
-        for key, value in job_data.items():
-            body += f"{key}: {value}\n"
-        return body
+        return "MSSQL Job Failure Alert\n\n" + "".join(
+            f"{key}: {value}\n" for key, value in job_data.items()
+        )
     
     def _extract_error_details(self, job_data: Dict[str, Any], analysis: str) -> Dict[str, str]:
         """Extract error details from job data and analysis."""
-        job_match = re.search(r'Job Name:\s*(.+)', analysis)
-        instance_match = re.search(r'Instance:\s*(.+)', analysis)
-        failure_match = re.search(r'Failure Time:\s*(.+)', analysis)
-        error_code_match = re.search(r'Error Code:\s*(.+)', analysis)
+        job_match = _JOB_RE.search(analysis)
+        instance_match = _INSTANCE_RE.search(analysis)
+        failure_match = _FAILURE_RE.search(analysis)
+        error_code_match = _ERROR_CODE_RE.search(analysis)
+        
+        # The analysis may be cached from an earlier occurrence, so the row's own time wins
+        failed_at = job_data.get('FailedDateTime')
+        if failed_at in (None, ''):
+            failed_at = failure_match.group(1).strip() if failure_match else 'N/A'
         
         return {
             'job_name': job_match.group(1).strip() if job_match else job_data.get('JobName', 'N/A'),
             'instance': instance_match.group(1).strip() if instance_match else job_data.get('ServerName', 'N/A'),
-            'failure_time': failure_match.group(1).strip() if failure_match else job_data.get('FailedDateTime', 'N/A'),
+            'failure_time': str(failed_at),
             'error_code': error_code_match.group(1).strip() if error_code_match else 'Unknown'
         }
     
     def _extract_summary(self, analysis: str) -> str:
         """Extract summary from analysis."""
-        summary_match = re.search(r'SUMMARY\n(.+?)(?:\n\n|\nURGENCY|$)', analysis, re.DOTALL)
+        summary_match = _SUMMARY_RE.search(analysis)
         return summary_match.group(1).strip() if summary_match else 'An error occurred during job execution.'
     
     def _extract_urgency(self, analysis: str) -> Dict[str, str]:
         """Extract urgency information."""
-        urgency_map = {
-            'HIGH': {'color': '#ffebee', 'border': '#f44336', 'level': 'HIGH'},
-            'MEDIUM': {'color': '#fff3e0', 'border': '#ff9800', 'level': 'MEDIUM'},
-            'LOW': {'color': '#e8f5e9', 'border': '#4caf50', 'level': 'LOW'}
-        }
-        
-        urgency_match = re.search(r'URGENCY:\s*(HIGH|MEDIUM|LOW)', analysis, re.IGNORECASE)
+        urgency_match = _URGENCY_LEVEL_RE.search(analysis)
         level = urgency_match.group(1).upper() if urgency_match else 'MEDIUM'
         
-        urgency_msg_match = re.search(r'URGENCY:.*?\n(.+?)(?:\n\n|\nSOLUTION|$)', analysis, re.DOTALL)
+        urgency_msg_match = _URGENCY_MSG_RE.search(analysis)
         message = urgency_msg_match.group(1).strip() if urgency_msg_match else 'Please review and address this issue.'
         
-        result = urgency_map.get(level, urgency_map['MEDIUM']).copy()
-        result['message'] = message
-        return result
+        color, border, level = _URGENCY_STYLES.get(level, _URGENCY_STYLES['MEDIUM'])
+        return {'color': color, 'border': border, 'level': level, 'message': message}
     
     def _format_solution(self, analysis: str) -> str:
         """Format solution steps with code blocks."""
-        solution_match = re.search(r'SOLUTION STEPS\n\n(.*?)(?:\nPREVENTIVE MEASURES|$)', analysis, re.DOTALL)
+        solution_match = _SOLUTION_RE.search(analysis)
         
         if not solution_match:
             return f'<div style="padding: 15px;">{self._escape_html(analysis)}</div>'
         
         solution_text = solution_match.group(1).strip()
         html_parts = []
-        lines = solution_text.split('\n')
-        
         current_step = []
         code_buffer = []
         in_code = False
         
-        for line in lines:
+        # Local bindings for the per-line loop
+        add_parts = html_parts.extend
+        add_step_text = current_step.append
+        add_code = code_buffer.append
+        escape = self._escape_html
+        sql_kw = _SQL_KW_RE.search
+        
+        for line in solution_text.splitlines():
             line_stripped = line.strip()
             
-            # Detect step headers
-            if re.match(r'^Step \d+:', line_stripped):
+            # Detect step headers (cheap prefix test before the regex confirms "Step N:")
+            if line_stripped.startswith('Step ') and _STEP_RE.match(line_stripped):
                 # Flush previous content
                 if current_step:
-                    html_parts.append(self._format_step(''.join(current_step)))
-                    current_step = []
+                    add_parts((_STEP_OPEN, escape(''.join(current_step)), _DIV_CLOSE))
+                    current_step.clear()
                 if code_buffer:
-                    html_parts.append(self._format_code('\n'.join(code_buffer)))
-                    code_buffer = []
+                    add_parts((_CODE_OPEN, escape('\n'.join(code_buffer)), _DIV_CLOSE))
+                    code_buffer.clear()
                     in_code = False
                 
-                current_step.append(line_stripped)
+                add_step_text(line_stripped)
             
             # Detect SQL code block markers
-            elif line_stripped.startswith('```sql') or line_stripped == '```':
-                if line_stripped.startswith('```sql'):
-                    # Start of SQL block
-                    if current_step:
-                        html_parts.append(self._format_step(''.join(current_step)))
-                        current_step = []
-                    in_code = True
-                elif line_stripped == '```' and in_code:
-                    # End of SQL block
+            elif line_stripped.startswith('```sql'):
+                # Start of SQL block
+                if current_step:
+                    add_parts((_STEP_OPEN, escape(''.join(current_step)), _DIV_CLOSE))
+                    current_step.clear()
+                in_code = True
+            elif line_stripped == '```':
+                # End of SQL block
+                if in_code:
                     if code_buffer:
-                        html_parts.append(self._format_code('\n'.join(code_buffer)))
-                        code_buffer = []
+                        add_parts((_CODE_OPEN, escape('\n'.join(code_buffer)), _DIV_CLOSE))
+                        code_buffer.clear()
                     in_code = False
             
             # Detect SQL/code lines (legacy format)
-            elif line_stripped.startswith('--') or any(kw in line.upper() for kw in ['SELECT', 'INSERT', 'UPDATE', 'DELETE', 'MERGE', 'CREATE', 'WITH', 'USE', 'EXEC']):
+            elif line_stripped.startswith('--') or sql_kw(line):
                 if current_step:
-                    html_parts.append(self._format_step(''.join(current_step)))
-                    current_step = []
+                    add_parts((_STEP_OPEN, escape(''.join(current_step)), _DIV_CLOSE))
+                    current_step.clear()
                 in_code = True
-                code_buffer.append(line)
+                add_code(line)
             
             # Continue code block
             elif in_code:
                 if line_stripped == '':
                     if code_buffer:
-                        html_parts.append(self._format_code('\n'.join(code_buffer)))
-                        code_buffer = []
+                        add_parts((_CODE_OPEN, escape('\n'.join(code_buffer)), _DIV_CLOSE))
+                        code_buffer.clear()
                         in_code = False
                 else:
-                    code_buffer.append(line)
+                    add_code(line)
             
             # Regular text
             elif line_stripped:
-                current_step.append('<br>' + line_stripped if current_step else line_stripped)
+                add_step_text('<br>' + line_stripped if current_step else line_stripped)
         
         # Flush remaining
         if current_step:
-            html_parts.append(self._format_step(''.join(current_step)))
+            add_parts((_STEP_OPEN, escape(''.join(current_step)), _DIV_CLOSE))
         if code_buffer:
-            html_parts.append(self._format_code('\n'.join(code_buffer)))
+            add_parts((_CODE_OPEN, escape('\n'.join(code_buffer)), _DIV_CLOSE))
         
         return ''.join(html_parts)
     
-    def _format_step(self, text: str) -> str:
-        """Format a step."""
-        return f'<div class="step-item">{self._escape_html(text)}</div>'
-    
-    def _format_code(self, code: str) -> str:
-        """Format code block."""
-        return f'<div class="sql-query">{self._escape_html(code)}</div>'
-    
     def _escape_html(self, text: str) -> str:
         """Escape HTML special characters."""
-        return (text
-                .replace('&', '&amp;')
-                .replace('<', '&lt;')
-                .replace('>', '&gt;')
-                .replace('"', '&quot;')
-                .replace("'", '&#39;'))
+        return text.translate(_ESCAPE_TABLE)
@@ -1,8 +1,12 @@
 """Email sender - handles SMTP sending only."""
+import logging
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Optional
+import threading
+from email.message import EmailMessage
+from email.policy import SMTP
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
 
 
 class EmailSender:
@@ -18,6 +22,55 @@ class EmailSender:
         self.smtp_server = config['smtp_server']
         self.smtp_port = config['smtp_port']
         self.sender_email = config['sender_email']
+        
+        # Persistent SMTP connection shared by all sends (guarded by lock)
+        self._server: Optional[smtplib.SMTP] = None
+        self._lock = threading.Lock()
+    
+    def _get_server(self) -> smtplib.SMTP:
+        """Return an open SMTP connection, reconnecting if it was dropped."""
+        if self._server is not None:
+            try:
+                self._server.noop()
+                return self._server
+            except (smtplib.SMTPException, OSError):
+                self._drop_server()
+        self._server = smtplib.SMTP(self.smtp_server, self.smtp_port)
+        return self._server
+    
+    def _drop_server(self) -> None:
+        """Discard the current SMTP connection."""
+        if self._server is not None:
+            try:
+                self._server.close()
+            finally:
+                self._server = None
+    
+    def ensure_connected(self) -> bool:
+        """
+        Open (or verify) the SMTP connection ahead of a send.
+        
+        Returns:
+            True if a connection is ready, False otherwise
+        """
+        with self._lock:
+            try:
+                self._get_server()
+                return True
+            except Exception as e:
+                self._drop_server()
+                logger.error("✗ SMTP connection failed: %s", e)
+                return False
+    
+    def close(self) -> None:
+        """Close the persistent SMTP connection."""
+        with self._lock:
+            if self._server is not None:
+                try:
+                    self._server.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self._drop_server()
     
     def send(
         self,
@@ -38,29 +91,68 @@ class EmailSender:
         Returns:
             True if email sent successfully, False otherwise
         """
-        if not html_body and not plain_body:
-            print("✗ No email body provided")
-            return False
+        return self.send_many([recipient], subject, html_body, plain_body) == 1
+    
+    def send_many(
+        self,
+        recipients: List[str],
+        subject: str,
+        html_body: Optional[str] = None,
+        plain_body: Optional[str] = None
+    ) -> int:
+        """
+        Send the same email to several recipients.
+        
+        The message is built and serialized once, then delivered to each
+        recipient in turn over the shared connection.
+        
+        Args:
+            recipients: Recipient email addresses
+            subject: Email subject
+            html_body: HTML email body (optional)
+            plain_body: Plain text email body (optional)
             
+        Returns:
+            Number of recipients the email was sent to
+        """
+        if not html_body and not plain_body:
+            logger.warning("✗ No email body provided")
+            return 0
+        
+        sent = 0
         try:
-            msg = MIMEMultipart('alternative')
+            msg = EmailMessage()
             msg['From'] = self.sender_email
-            msg['To'] = recipient
+            msg['To'] = ", ".join(recipients)
             msg['Subject'] = subject
             
-            # Attach body content
+            # Plain text first, HTML as the preferred alternative
             if plain_body:
-                msg.attach(MIMEText(plain_body, 'plain'))
-            if html_body:
-                msg.attach(MIMEText(html_body, 'html'))
+                msg.set_content(plain_body)
+                if html_body:
+                    msg.add_alternative(html_body, subtype='html')
+            else:
+                msg.set_content(html_body, subtype='html')
             
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.sendmail(self.sender_email, recipient, msg.as_string())
+            # Serialize once (CRLF line endings) and reuse for every recipient
+            payload = msg.as_bytes(policy=SMTP)
             
-            print(f"✓ Email sent successfully to {recipient}")
-            return True
+            # Send email over the shared connection
+            with self._lock:
+                for recipient in recipients:
+                    try:
+                        self._get_server().sendmail(self.sender_email, [recipient], payload)
+                    except smtplib.SMTPRecipientsRefused as e:
+                        # Only this address was rejected; the connection is still usable
+                        logger.warning("✗ Recipient refused %s: %s", recipient, e)
+                        continue
+                    except Exception:
+                        self._drop_server()
+                        raise
+                    sent += 1
+                    logger.info("✓ Email sent successfully to %s", recipient)
+            return sent
             
-        except Exception as e:
-            print(f"✗ Failed to send email: {e}")
-            return False
+        except Exception:
+            logger.exception("✗ Failed to send email")
+            return sent
@@ -0,0 +1,190 @@
+"""Sent-email tracker - SQLite log used to throttle duplicate alerts."""
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_HOURS = 24  # Minimum gap between emails for the same failure
+MAX_SENT_RECORDS = 10_000  # Upper bound on rows kept in the sent log
+
+
+@lru_cache(maxsize=4096)
+def _hash_key(job_name: Any, server_name: Any, failed_at: Any, message: Any) -> str:
+    """Hash the identifying fields of a job failure (memoised)."""
+    # Stable, delimiter-safe key; SHA-256 uses SHA-NI via OpenSSL where available
+    key = orjson.dumps({
+        'j': job_name,
+        's': server_name,
+        't': failed_at,
+        'm': message
+    }, option=orjson.OPT_SORT_KEYS, default=str)
+    return hashlib.sha256(key).hexdigest()[:32]
+
+
+def _as_text(value: Any) -> Optional[str]:
+    """Coerce a DB value to text for storage (None stays None)."""
+    return None if value is None else str(value)
+
+
+class DuplicateTracker:
+    """Track sent emails to prevent duplicates (SQLite-backed)."""
+    
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sent (
+            hash TEXT PRIMARY KEY,
+            job_name TEXT,
+            server_name TEXT,
+            failed_at TEXT,
+            sent_to TEXT,
+            sent_at INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_sent_at ON sent(sent_at DESC);
+    """
+    _COLUMNS = "hash, job_name, server_name, failed_at, sent_to, sent_at"
+    
+    def __init__(
+        self,
+        db_file: Path,
+        legacy_log_file: Optional[Path] = None,
+        retention_hours: int = THROTTLE_HOURS * 2,
+        max_records: int = MAX_SENT_RECORDS
+    ):
+        self.db_file = db_file
+        self.retention_hours = retention_hours
+        self.max_records = max_records
+        self._lock = threading.Lock()
+        
+        is_new = not db_file.exists()
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self._SCHEMA)
+        
+        if is_new and legacy_log_file:
+            self._import_legacy_log(legacy_log_file)
+        self.prune()
+        logger.info("Tracking %s sent email records in %s", self.count(), db_file)
+    
+    def _import_legacy_log(self, log_file: Path):
+        """Import records from the old JSON Lines (or JSON array) sent log."""
+        legacy_json = log_file.with_suffix('.json')
+        try:
+            if log_file.exists():
+                with open(log_file, 'rb') as f:
+                    entries = [orjson.loads(line) for line in f if line.strip()]
+            elif legacy_json.exists():
+                entries = orjson.loads(legacy_json.read_bytes())
+            else:
+                return
+        except Exception as e:
+            logger.error("Error reading legacy log file: %s", e)
+            return
+        
+        for entry in entries:
+            if isinstance(entry['sent_at'], str):
+                # Older records stored ISO-8601 strings
+                entry['sent_at'] = int(datetime.fromisoformat(entry['sent_at']).timestamp())
+            self._upsert(entry)
+        self.conn.commit()
+        logger.info("Imported %s records from legacy sent log", len(entries))
+    
+    def _upsert(self, entry: Dict[str, Any]):
+        """Insert or replace the record for a failure hash (caller commits)."""
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO sent ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)",
+            (entry['hash'], entry['job_name'], entry['server_name'],
+             entry['failed_at'], entry['sent_to'], entry['sent_at'])
+        )
+    
+    def prune(self):
+        """Delete records outside the retention window, keeping at most max_records."""
+        with self._lock:
+            self._prune()
+            self.conn.commit()
+    
+    def _prune(self):
+        """Apply the retention window and record cap (caller holds the lock and commits)."""
+        cutoff = time.time() - self.retention_hours * 3600
+        self.conn.execute("DELETE FROM sent WHERE sent_at <= ?", (cutoff,))
+        # The cap query walks up to max_records index entries; skip it until the table is over the cap
+        if self.conn.execute("SELECT COUNT(*) FROM sent").fetchone()[0] > self.max_records:
+            # Keep the newest max_records rows; rowid orders sends within the same second
+            self.conn.execute(
+                "DELETE FROM sent WHERE hash NOT IN "
+                "(SELECT hash FROM sent ORDER BY sent_at DESC, rowid DESC LIMIT ?)",
+                (self.max_records,)
+            )
+    
+    def create_hash(self, job_data: Dict[str, Any]) -> str:
+        """Create unique hash for job failure."""
+        return _hash_key(
+            job_data.get('JobName'),
+            job_data.get('ServerName'),
+            job_data.get('FailedDateTime'),
+            job_data.get('FailureMessage')
+        )
+    
+    def should_send(self, job_data: Dict[str, Any], throttle_hours: int = THROTTLE_HOURS) -> tuple[bool, Optional[Dict]]:
+        """
+        Check if email should be sent (not sent within throttle window).
+        
+        Returns:
+            (should_send: bool, last_sent_info: Optional[Dict])
+        """
+        email_hash = self.create_hash(job_data)
+        
+        # Find if this failure was sent before (primary-key lookup)
+        with self._lock:
+            row = self.conn.execute(
+                f"SELECT {self._COLUMNS} FROM sent WHERE hash = ?", (email_hash,)
+            ).fetchone()
+        if row and time.time() - row['sent_at'] < throttle_hours * 3600:
+            # Too soon, don't send
+            return False, dict(row)
+        
+        return True, None
+    
+    def log_sent(self, job_data: Dict[str, Any], recipient: str):
+        """Log that email was sent."""
+        entry = {
+            'hash': self.create_hash(job_data),
+            'job_name': _as_text(job_data.get('JobName')),
+            'server_name': _as_text(job_data.get('ServerName')),
+            'failed_at': _as_text(job_data.get('FailedDateTime')),
+            'sent_to': recipient,
+            'sent_at': int(time.time())  # epoch seconds
+        }
+        # Record and prune in one transaction, so each send commits (and syncs) once
+        with self._lock:
+            self._upsert(entry)
+            self._prune()
+            self.conn.commit()
+    
+    def get_recent_sent(self, limit: int = 20) -> List[Dict]:
+        """Get recently sent emails, most recent first."""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {self._COLUMNS} FROM sent ORDER BY sent_at DESC, rowid DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+    
+    def count(self) -> int:
+        """Number of tracked records."""
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM sent").fetchone()[0]
+    
+    def clear(self) -> int:
+        """Clear sent email history. Returns number of records removed."""
+        with self._lock:
+            cursor = self.conn.execute("DELETE FROM sent")
+            self.conn.commit()
+        return cursor.rowcount
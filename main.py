@@ -1,5 +1,6 @@
 """Main entry point for MSSQL Agent."""
 import asyncio
+import logging
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
@@ -11,6 +12,12 @@ from mail.formatter import EmailFormatter
 from mail.sender import EmailSender
 
 
+def _fetch_latest_failure(db: MSSQLConnector) -> dict:
+    """Connect, fetch the most recent failure row and disconnect."""
+    with db:
+        return db.fetch_last_row("FailedJobData_Archive")
+
+
 async def analyze_and_send(recipient_email: str = None) -> bool:
     """
     Main workflow: Fetch job failure → Analyze → Format → Send email.
@@ -28,35 +35,40 @@ async def analyze_and_send(recipient_email: str = None) -> bool:
     # Step 1: Initialize components
     print("\n📦 Initializing components...")
     db = MSSQLConnector(settings.get_db_config())
-    analyzer = FailureAnalyzer()
     formatter = EmailFormatter()
     sender = EmailSender(settings.get_email_config())
     
-    # Check if analyzer is ready
-    if not analyzer.is_available():
-        print("❌ LLM provider not available. Check API key.")
-        return False
-    
     try:
-        # Step 2: Connect to database and fetch data
+        # Step 2: Fetch data while the LLM client is set up (both block, so use threads)
         print("\n📊 Fetching latest job failure from database...")
-        with db:
-            job_data = db.fetch_last_row("FailedJobData_Archive")
-            if not job_data:
-                print("⚠️  No job failures found in database")
-                return False
-            
-            # Use EmailID from database if not provided
-            if not recipient_email:
-                recipient_email = job_data.get('EmailID') or job_data.get('EmailId') or settings.SENDER_EMAIL
-            
-            print(f"✓ Found job failure: {job_data.get('JobName', 'Unknown')}")
-            print(f"  Server: {job_data.get('ServerName', 'Unknown')}")
-            print(f"  Time: {job_data.get('FailedDateTime', 'Unknown')}")
-            print(f"  Recipient: {recipient_email}")
+        job_data, analyzer = await asyncio.gather(
+            asyncio.to_thread(_fetch_latest_failure, db),
+            asyncio.to_thread(FailureAnalyzer)
+        )
         
-        # Step 3: Analyze with LLM
-        analysis = await analyzer.analyze(job_data)
+        # Check if analyzer is ready
+        if not analyzer.is_available():
+            print("❌ LLM provider not available. Check API key.")
+            return False
+        
+        if not job_data:
+            print("⚠️  No job failures found in database")
+            return False
+        
+        # Use EmailID from database if not provided
+        if not recipient_email:
+            recipient_email = job_data.get('EmailID') or job_data.get('EmailId') or settings.SENDER_EMAIL
+        
+        print(f"✓ Found job failure: {job_data.get('JobName', 'Unknown')}")
+        print(f"  Server: {job_data.get('ServerName', 'Unknown')}")
+        print(f"  Time: {job_data.get('FailedDateTime', 'Unknown')}")
+        print(f"  Recipient: {recipient_email}")
+        
+        # Step 3: Analyze with LLM while the SMTP connection opens
+        analysis, _ = await asyncio.gather(
+            analyzer.analyze(job_data),
+            asyncio.to_thread(sender.ensure_connected)
+        )
         if not analysis:
             print("❌ Failed to get analysis from LLM")
             return False
@@ -69,7 +81,9 @@ async def analyze_and_send(recipient_email: str = None) -> bool:
         # Step 5: Send email
         print(f"\n✉️  Sending email to {recipient_email}...")
         subject = f"[URGENT] SQL Job Failure: {job_data.get('JobName', 'Unknown Job')}"
-        success = sender.send(
+        # smtplib blocks; run it on a worker thread
+        success = await asyncio.to_thread(
+            sender.send,
             recipient=recipient_email,
             subject=subject,
             html_body=html_body,
@@ -87,10 +101,15 @@ async def analyze_and_send(recipient_email: str = None) -> bool:
     except Exception as e:
         print(f"❌ Error in workflow: {e}")
         return False
+    finally:
+        sender.close()
 
 
 def main():
     """CLI entry point."""
+    # Show component progress messages alongside the workflow output
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    
     # Get recipient from command line (optional)
     # If not provided, will use EmailID from database
     recipient = sys.argv[1] if len(sys.argv) > 1 else None
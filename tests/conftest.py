@@ -0,0 +1,4 @@
+"""Pytest configuration for the test suite."""
+
+# End-to-end script that needs a live database, LLM and SMTP; run it directly
+collect_ignore = ["test_workflow.py"]
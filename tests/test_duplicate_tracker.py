@@ -0,0 +1,138 @@
+"""Test the SQLite-backed sent-email tracker."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import orjson
+import pytest
+
+from mail import tracker as tracker_module
+from mail.tracker import DuplicateTracker
+
+NOW = 1_760_000_000  # Fixed epoch seconds for every test
+
+
+def _job(n: int = 0) -> dict:
+    return {
+        'JobName': f'Job{n}',
+        'ServerName': 'SERVERX',
+        'FailedDateTime': '2025-11-13T08:30:00',
+        'FailureMessage': 'Violation of PRIMARY KEY constraint'
+    }
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time() as seen by the tracker."""
+    now = [NOW]
+    monkeypatch.setattr(tracker_module.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def tracker(tmp_path, clock):
+    tracker = DuplicateTracker(tmp_path / "sent.db")
+    yield tracker
+    tracker.conn.close()
+
+
+def test_throttles_within_window(tracker, clock):
+    assert tracker.should_send(_job(), throttle_hours=24) == (True, None)
+
+    tracker.log_sent(_job(), 'dba@example.com')
+    should_send, last_sent = tracker.should_send(_job(), throttle_hours=24)
+    assert not should_send
+    assert last_sent['sent_to'] == 'dba@example.com'
+    assert last_sent['sent_at'] == NOW
+
+    # A different failure is not throttled
+    assert tracker.should_send(_job(1), throttle_hours=24)[0]
+
+    clock[0] = NOW + 24 * 3600
+    assert tracker.should_send(_job(), throttle_hours=24)[0]
+
+
+def test_resend_replaces_record(tracker, clock):
+    tracker.log_sent(_job(), 'a@example.com')
+    clock[0] = NOW + 60
+    tracker.log_sent(_job(), 'b@example.com')
+    assert tracker.count() == 1
+    assert tracker.get_recent_sent()[0]['sent_to'] == 'b@example.com'
+
+
+def test_prune_drops_records_past_retention(tmp_path, clock):
+    tracker = DuplicateTracker(tmp_path / "sent.db", retention_hours=48)
+    tracker.log_sent(_job(0), 'dba@example.com')
+    clock[0] = NOW + 47 * 3600
+    tracker.log_sent(_job(1), 'dba@example.com')
+
+    clock[0] = NOW + 48 * 3600
+    tracker.prune()
+    assert [row['job_name'] for row in tracker.get_recent_sent()] == ['Job1']
+
+
+def test_cap_keeps_newest_even_when_sent_in_same_second(tmp_path, clock):
+    tracker = DuplicateTracker(tmp_path / "sent.db", max_records=3)
+    for n in range(6):
+        tracker.log_sent(_job(n), 'dba@example.com')
+
+    assert tracker.count() == 3
+    assert [row['job_name'] for row in tracker.get_recent_sent()] == ['Job5', 'Job4', 'Job3']
+
+
+def test_log_sent_commits_once_and_skips_cap_under_limit(tmp_path, clock):
+    tracker = DuplicateTracker(tmp_path / "sent.db", max_records=3)
+    statements = []
+    tracker.conn.set_trace_callback(statements.append)
+    tracker.log_sent(_job(), 'dba@example.com')
+
+    assert statements.count('COMMIT') == 1
+    assert not any('NOT IN' in sql for sql in statements)
+
+
+def test_clear_returns_removed_count(tracker):
+    tracker.log_sent(_job(0), 'dba@example.com')
+    tracker.log_sent(_job(1), 'dba@example.com')
+    assert tracker.clear() == 2
+    assert tracker.count() == 0
+
+
+def _legacy_entry(tracker_hash: str, sent_at) -> dict:
+    return {
+        'hash': tracker_hash,
+        'job_name': 'Job0',
+        'server_name': 'SERVERX',
+        'failed_at': '2025-11-13T08:30:00',
+        'sent_to': 'dba@example.com',
+        'sent_at': sent_at
+    }
+
+
+def test_imports_legacy_json_lines_log(tmp_path, clock):
+    job_hash = tracker_module._hash_key('Job0', 'SERVERX', '2025-11-13T08:30:00', 'Violation of PRIMARY KEY constraint')
+    legacy = tmp_path / "email_sent_log.jsonl"
+    legacy.write_bytes(
+        orjson.dumps(_legacy_entry(job_hash, NOW - 3600)) + b"\n"
+        + orjson.dumps(_legacy_entry('other', NOW - 7200)) + b"\n"
+    )
+
+    tracker = DuplicateTracker(tmp_path / "sent.db", legacy_log_file=legacy)
+    assert tracker.count() == 2
+    assert not tracker.should_send(_job(), throttle_hours=24)[0]
+
+
+def test_imports_legacy_json_array_with_iso_timestamps(tmp_path, clock):
+    sent_at = tracker_module.datetime.fromtimestamp(NOW - 3600).isoformat()
+    (tmp_path / "email_sent_log.json").write_bytes(orjson.dumps([_legacy_entry('h1', sent_at)]))
+
+    tracker = DuplicateTracker(tmp_path / "sent.db", legacy_log_file=tmp_path / "email_sent_log.jsonl")
+    assert tracker.get_recent_sent()[0]['sent_at'] == NOW - 3600
+
+
+def test_legacy_log_is_only_imported_into_a_new_database(tmp_path, clock):
+    legacy = tmp_path / "email_sent_log.jsonl"
+    DuplicateTracker(tmp_path / "sent.db").conn.close()
+    legacy.write_bytes(orjson.dumps(_legacy_entry('h1', NOW)) + b"\n")
+
+    tracker = DuplicateTracker(tmp_path / "sent.db", legacy_log_file=legacy)
+    assert tracker.count() == 0
@@ -0,0 +1,174 @@
+"""Test FailureAnalyzer batching and caching with a stand-in LLM provider."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import asyncio
+import json
+import re
+
+import pytest
+
+from features import failure_analyzer
+from features.failure_analyzer import FailureAnalyzer
+
+
+class FakeLLM:
+    """Answers batch prompts with a JSON array and single prompts with plain text."""
+
+    def __init__(self, batch_response=None):
+        self.prompts = []
+        self.batch_response = batch_response
+
+    async def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        names = re.findall(r'- Job Name: (\S+)', prompt)
+        if prompt.startswith("You will analyze"):
+            if self.batch_response is not None:
+                return self.batch_response
+            return json.dumps([{"id": i, "analysis": f"batch:{name}"} for i, name in enumerate(names, start=1)])
+        return f"single:{names[0]}"
+
+    def is_available(self) -> bool:
+        return True
+
+
+def _job(n: int) -> dict:
+    return {'JobName': f'Job{n}', 'ServerName': 'SERVERX', 'FailedDateTime': '2025-11-13T08:30:00', 'FailureMessage': 'Timeout'}
+
+
+@pytest.fixture
+def llm():
+    return FakeLLM()
+
+
+@pytest.fixture
+def analyzer(monkeypatch, llm):
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    analyzer = FailureAnalyzer(batch_size=4)
+    analyzer.llm_provider = llm
+    return analyzer
+
+
+def test_parse_batch_response_plain_and_fenced():
+    items = [{"id": 1, "analysis": "a"}, {"id": 2, "analysis": "b"}]
+    assert FailureAnalyzer._parse_batch_response(json.dumps(items)) == items
+    assert FailureAnalyzer._parse_batch_response("```json\n" + json.dumps(items) + "\n```") == items
+
+
+def test_parse_batch_response_drops_items_without_id():
+    assert FailureAnalyzer._parse_batch_response('[{"id": 1, "analysis": "a"}, {"analysis": "b"}, 3]') == [
+        {"id": 1, "analysis": "a"}
+    ]
+
+
+def test_parse_batch_response_rejects_non_arrays():
+    with pytest.raises(ValueError):
+        FailureAnalyzer._parse_batch_response('{"id": 1, "analysis": "a"}')
+    with pytest.raises(ValueError):
+        FailureAnalyzer._parse_batch_response('[{"id": 1, "analysis": "trunc')
+
+
+def test_batch_is_split_into_requests_of_batch_size(analyzer, llm):
+    jobs = [_job(n) for n in range(9)]
+    results = asyncio.run(analyzer.analyze_batch(jobs))
+
+    # 4 + 4 in two batched requests; the leftover job is analyzed on its own
+    assert [prompt.count("--- FAILURE") for prompt in llm.prompts] == [4, 4, 0]
+    assert results == [f"batch:Job{n}" for n in range(8)] + ["single:Job8"]
+
+
+def test_cached_jobs_are_not_batched(analyzer, llm):
+    asyncio.run(analyzer.analyze(_job(0)))
+    results = asyncio.run(analyzer.analyze_batch([_job(0), _job(1), _job(2)]))
+    assert [prompt.count("--- FAILURE") for prompt in llm.prompts] == [0, 2]
+    assert results == ["single:Job0", "batch:Job1", "batch:Job2"]
+
+
+def test_unparseable_batch_falls_back_to_individual_calls(analyzer, llm):
+    llm.batch_response = '[{"id": 1, "analysis": "cut off'
+    results = asyncio.run(analyzer.analyze_batch([_job(0), _job(1)]))
+    assert results == ["single:Job0", "single:Job1"]
+    assert len(llm.prompts) == 3
+
+
+def test_jobs_missing_from_batch_response_fall_back(analyzer, llm):
+    llm.batch_response = json.dumps([{"id": 2, "analysis": "batch:Job1"}, {"id": 9, "analysis": "stray"}])
+    results = asyncio.run(analyzer.analyze_batch([_job(0), _job(1)]))
+    assert results == ["single:Job0", "batch:Job1"]
+
+
+def test_cache_entries_expire_after_ttl(monkeypatch, analyzer, llm):
+    now = [1_760_000_000.0]
+    monkeypatch.setattr(failure_analyzer.time, 'time', lambda: now[0])
+    asyncio.run(analyzer.analyze(_job(0)))
+    now[0] += analyzer.cache_ttl - 1
+    asyncio.run(analyzer.analyze(_job(0)))
+    assert len(llm.prompts) == 1
+
+    now[0] += 1
+    asyncio.run(analyzer.analyze(_job(0)))
+    assert len(llm.prompts) == 2
+
+
+def test_cache_evicts_least_recently_used(analyzer, llm):
+    analyzer.cache_size = 2
+
+    async def run():
+        await analyzer.analyze(_job(0))
+        await analyzer.analyze(_job(1))
+        await analyzer.analyze(_job(0))  # Job0 is now the most recent
+        await analyzer.analyze(_job(2))  # evicts Job1
+        await analyzer.analyze(_job(0))
+        await analyzer.analyze(_job(1))
+    asyncio.run(run())
+    assert [re.findall(r'- Job Name: (\S+)', prompt)[0] for prompt in llm.prompts] == ['Job0', 'Job1', 'Job2', 'Job1']
+
+
+def test_concurrent_identical_failures_share_one_request(analyzer, llm):
+    async def run():
+        return await asyncio.gather(*[analyzer.analyze(_job(0)) for _ in range(5)])
+    assert asyncio.run(run()) == ["single:Job0"] * 5
+    assert len(llm.prompts) == 1
+    assert analyzer._inflight == {}
+
+
+def test_failure_time_does_not_split_the_cache(analyzer, llm):
+    asyncio.run(analyzer.analyze(_job(0)))
+    asyncio.run(analyzer.analyze({**_job(0), 'FailedDateTime': '2025-11-13T09:45:00'}))
+    assert len(llm.prompts) == 1
+
+
+def test_cache_survives_restart(monkeypatch, tmp_path, llm):
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    cache_file = tmp_path / "analysis_cache.json"
+
+    async def analyze_and_flush(analyzer):
+        result = await analyzer.analyze(_job(0))
+        await analyzer.flush()
+        return result
+
+    first = FailureAnalyzer(cache_file=cache_file)
+    first.llm_provider = llm
+    asyncio.run(analyze_and_flush(first))
+
+    restarted = FailureAnalyzer(cache_file=cache_file)
+    restarted.llm_provider = FakeLLM()
+    assert asyncio.run(analyze_and_flush(restarted)) == "single:Job0"
+    assert restarted.llm_provider.prompts == []
+
+
+def test_analysis_returns_without_waiting_for_cache_write(monkeypatch, tmp_path, llm):
+    monkeypatch.setenv('GEMINI_API_KEY', 'test-key')
+    analyzer = FailureAnalyzer(cache_file=tmp_path / "analysis_cache.json")
+    analyzer.llm_provider = llm
+
+    async def run():
+        async with analyzer._save_lock:
+            # A write in progress holds the lock; analyses still complete
+            results = await asyncio.gather(analyzer.analyze(_job(0)), analyzer.analyze(_job(1)))
+            assert not (tmp_path / "analysis_cache.json").exists()
+        await analyzer.flush()
+        return results
+    assert asyncio.run(run()) == ["single:Job0", "single:Job1"]
+    assert len(json.loads((tmp_path / "analysis_cache.json").read_text())) == 2
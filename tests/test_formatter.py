@@ -0,0 +1,80 @@
+"""Test EmailFormatter output against the original implementation's rendering."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import datetime
+import json
+from pathlib import Path
+
+import pytest
+
+from mail import formatter as formatter_module
+from mail.formatter import EmailFormatter
+
+# Reference analyses with the fragments the original formatter produced for them
+BASELINE = json.loads((Path(__file__).parent / "data" / "formatter_baseline.json").read_text(encoding='utf-8'))
+CASES = {case['name']: case for case in BASELINE['cases']}
+
+
+@pytest.fixture
+def formatter():
+    return EmailFormatter()
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_solution_matches_baseline(formatter, name):
+    case = CASES[name]
+    assert formatter._format_solution(case['analysis']) == case['solution_html']
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_summary_and_urgency_match_baseline(formatter, name):
+    case = CASES[name]
+    assert formatter._extract_summary(case['analysis']) == case['summary']
+    assert formatter._extract_urgency(case['analysis']) == case['urgency']
+
+
+def test_email_matches_baseline(formatter, monkeypatch):
+    """Full HTML and plain bodies, with the timestamp pinned."""
+    class FixedDateTime:
+        @staticmethod
+        def now():
+            return datetime.datetime.strptime(BASELINE['timestamp'], '%Y-%m-%d %H:%M:%S')
+
+    monkeypatch.setattr(formatter_module, 'datetime', FixedDateTime)
+    email = BASELINE['email']
+    html_body, plain_body = formatter.format_email(
+        CASES[email['analysis']]['analysis'], BASELINE['job'], BASELINE['sender_email']
+    )
+    assert html_body == email['html']
+    assert plain_body == email['plain']
+
+
+def test_template_keeps_unknown_placeholders_and_dollars():
+    template = formatter_module._PlaceholderTemplate("{{job_name}} costs $5 ${x} {{new_field}}")
+    assert template.safe_substitute(job_name="Nightly") == "Nightly costs $5 ${x} {{new_field}}"
+
+
+def test_plain_body_without_fields(formatter):
+    assert formatter.format_plain({}) == "MSSQL Job Failure Alert\n\n"
+
+
+def test_failure_time_prefers_job_row(formatter):
+    """A cached analysis may carry an earlier occurrence's time."""
+    analysis = "Failure Time: 2025-11-13 08:00\n"
+    details = formatter._extract_error_details({'FailedDateTime': '2025-11-13T08:04:00'}, analysis)
+    assert details['failure_time'] == '2025-11-13T08:04:00'
+    assert formatter._extract_error_details({}, analysis)['failure_time'] == '2025-11-13 08:00'
+    assert formatter._extract_error_details({}, '')['failure_time'] == 'N/A'
+
+
+def test_sql_keywords_match_whole_words_only(formatter):
+    html = formatter._format_solution(
+        "SOLUTION STEPS\n\nStep 1: Check the USER account\nThis happens because of users\nexec dbo.fix\n"
+    )
+    assert html == (
+        '<div class="step-item">Step 1: Check the USER account&lt;br&gt;This happens because of users</div>'
+        '<div class="sql-query">exec dbo.fix</div>'
+    )
+
@@ -0,0 +1,58 @@
+"""Test Gemini streaming against the chunk shapes google-generativeai returns."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import asyncio
+
+import google.ai.generativelanguage as glm
+import pytest
+from google.generativeai.types import generation_types
+
+from llm import GeminiProvider
+
+
+def _chunk(**fields):
+    return generation_types.GenerateContentResponse.from_response(glm.GenerateContentResponse(**fields))
+
+
+def _text_chunk(text: str):
+    return _chunk(candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=text)]))])
+
+
+class FakeModel:
+    """Stands in for GenerativeModel, streaming canned chunks."""
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    async def generate_content_async(self, prompt, stream=False):
+        async def stream_chunks():
+            for chunk in self.chunks:
+                yield chunk
+        return stream_chunks()
+
+
+def _stream(chunks) -> list:
+    provider = GeminiProvider(api_key="test-key")
+    provider.client = FakeModel(chunks)
+
+    async def collect():
+        return [text async for text in provider.generate_stream("prompt")]
+    return asyncio.run(collect())
+
+
+def test_skips_finish_reason_only_chunk():
+    chunks = [_text_chunk("Root cause"), _text_chunk(": disk full"), _chunk(candidates=[glm.Candidate(finish_reason=1)])]
+    assert _stream(chunks) == ["Root cause", ": disk full"]
+
+
+def test_blocked_prompt_raises():
+    with pytest.raises(ValueError, match="no candidates"):
+        _stream([_chunk(prompt_feedback={'block_reason': 1})])
+
+
+def test_safety_stop_mid_stream_raises():
+    chunks = [_text_chunk("Root cause"), _chunk(candidates=[glm.Candidate(finish_reason=3)])]
+    with pytest.raises(ValueError, match="SAFETY"):
+        _stream(chunks)
@@ -0,0 +1,73 @@
+"""Test resuming the failure poll from the stored watermark."""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from datetime import datetime
+
+import orjson
+import pytest
+
+from features.watermark import FailureWatermark
+
+
+def _row(key: int, failed_at: str = '2025-11-13T08:30:00') -> dict:
+    return {'Id': key, 'JobName': f'Job{key}', 'FailedDateTime': failed_at}
+
+
+def _poll(watermark: FailureWatermark, rows: list, failed: set):
+    """Advance as analyze_new does, with the row keys in failed reported as failed sends."""
+    hashes = [f"h{row['Id']}" for row in rows]
+    status_by_hash = {f"h{row['Id']}": "failed" if row['Id'] in failed else "sent" for row in rows}
+    return watermark.advance(rows, hashes, status_by_hash, 'Id')
+
+
+@pytest.fixture
+def watermark(tmp_path):
+    return FailureWatermark(tmp_path / "last_processed_failure.txt", max_attempts=3)
+
+
+def test_no_watermark_file(watermark):
+    assert watermark.load() is None
+
+
+def test_tied_timestamps_resume_by_key(watermark):
+    rows = [_row(1), _row(2), _row(3)]
+    _poll(watermark, rows, failed={3})
+    # Row 3 shares row 2's time; the key lets the next fetch pick it up
+    assert watermark.load() == (datetime(2025, 11, 13, 8, 30), 2)
+
+
+def test_reads_old_timestamp_only_format(watermark):
+    watermark.path.write_text("2025-11-13T08:30:00\n")
+    assert watermark.load() == (datetime(2025, 11, 13, 8, 30), None)
+
+    _poll(watermark, [_row(7, '2025-11-13T09:00:00')], failed=set())
+    assert watermark.load() == (datetime(2025, 11, 13, 9, 0), 7)
+
+
+def test_unreadable_file_starts_over(watermark):
+    watermark.path.write_text("{not json")
+    assert watermark.load() is None
+
+
+def test_failed_row_mid_batch_holds_watermark_then_is_skipped(watermark):
+    rows = [_row(1, '2025-11-13T08:00:00'), _row(2, '2025-11-13T08:10:00'), _row(3, '2025-11-13T08:20:00')]
+    assert _poll(watermark, rows, failed={2}) == rows[0]
+    assert watermark.load() == (datetime(2025, 11, 13, 8, 0), 1)
+
+    # Later polls re-fetch from row 2; row 3 stays after it until row 2 has used its attempts
+    assert _poll(watermark, rows[1:], failed={2}) is None
+    assert watermark.load() == (datetime(2025, 11, 13, 8, 0), 1)
+    assert _poll(watermark, rows[1:], failed={2}) == rows[2]
+    assert watermark.load() == (datetime(2025, 11, 13, 8, 20), 3)
+    assert orjson.loads(watermark.path.read_bytes())['attempts'] == {}
+
+
+def test_retry_that_succeeds_clears_attempts(watermark):
+    rows = [_row(1), _row(2)]
+    _poll(watermark, rows, failed={1})
+    assert watermark.load() is None
+
+    assert _poll(watermark, rows, failed=set()) == rows[1]
+    assert orjson.loads(watermark.path.read_bytes())['attempts'] == {}